@@ -5,6 +5,8 @@ from sqladmin.authentication import AuthenticationBackend
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
 
+from app.exceptions import TooManyRequestsException, ServiceOverloadedException
+from app.rate_limit import RateLimiter
 from app.user.auth import AuthService
 from app.user.dependencies import get_current_user
 
@@ -14,6 +16,11 @@ class AdminAuth(AuthenticationBackend):
         form = await request.form()
         email, password = form["username"], form["password"]
 
+        try:
+            await RateLimiter.check("login", RateLimiter.identity(request))
+        except (TooManyRequestsException, ServiceOverloadedException):
+            return False
+
         user = await AuthService.authenticate_user(email, password)
 
         if user:
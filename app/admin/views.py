@@ -1,5 +1,6 @@
 from sqladmin import ModelView
 
+from app.user.cache import principal_cache
 from app.user.models import User
 
 
@@ -9,4 +10,7 @@ class UserAdmin(ModelView, model=User):
     can_delete = False
     name = "Пользователь"
     name_plural = "Пользователи"
-    icon = "fa-solid fa-user"
\ No newline at end of file
+    icon = "fa-solid fa-user"
+
+    async def after_model_change(self, data, model, is_created, request):
+        await principal_cache.delete(model.id)
@@ -0,0 +1,156 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import redis
+from redis.exceptions import RedisError
+
+from app.logger import logger
+from app.metrics import metrics
+from app.redis_client import redis_client
+
+
+# Записываем значение, только если с момента чтения версии ключ не инвалидировали
+SET_IF_VERSION_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+set_if_version = redis_client.register_script(SET_IF_VERSION_SCRIPT)
+
+
+class LRUCache:
+    """
+    LRU-кэш процесса с ограничением размера и TTL
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+
+        if item is None:
+            return None
+
+        expires_at, value = item
+
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+
+class RedisLRUCache:
+    """
+    Двухуровневый кэш строк: LRU процесса перед Redis.
+    Локальный TTL короткий, т.к. инвалидация в других процессах до него не доходит.
+    Инвалидация увеличивает версию ключа: заполнение, прочитавшее БД до инвалидации, значение не запишет
+    """
+
+    def __init__(self, name: str, ttl: int, local_ttl: float, max_size: int):
+        self.name = name
+        self.ttl = ttl
+        self.local = LRUCache(max_size, local_ttl)
+
+    def key(self, key) -> str:
+        return f"{self.name}:{key}"
+
+    def version_key(self, key) -> str:
+        return f"{self.name}:{key}:version"
+
+    async def get(self, key) -> Optional[str]:
+        value = self.local.get(key)
+
+        if value is not None:
+            metrics.incr(f"cache.{self.name}.hit_local")
+            return value
+
+        try:
+            value = await redis_client.get(self.key(key))
+        except RedisError:
+            logger.error("Redis Exc: Cannot read cache", exc_info=True)
+
+        if value is None:
+            metrics.incr(f"cache.{self.name}.miss")
+            return None
+
+        metrics.incr(f"cache.{self.name}.hit_redis")
+        self.local.set(key, value)
+
+        return value
+
+    async def version(self, key) -> Optional[str]:
+        """
+        Версию читаем до запроса в БД и передаем в set
+        """
+        try:
+            return await redis_client.get(self.version_key(key)) or "0"
+        except RedisError:
+            logger.error("Redis Exc: Cannot read cache version", exc_info=True)
+            return None
+
+    async def set(self, key, value: str, version: Optional[str] = None):
+        if version is None:
+            self.local.set(key, value)
+
+            try:
+                await redis_client.set(self.key(key), value, ex=self.ttl)
+            except RedisError:
+                logger.error("Redis Exc: Cannot write cache", exc_info=True)
+
+            return
+
+        try:
+            stored = await set_if_version(keys=[self.key(key), self.version_key(key)], args=[version, value, self.ttl])
+        except RedisError:
+            logger.error("Redis Exc: Cannot write cache", exc_info=True)
+            return
+
+        if stored:
+            self.local.set(key, value)
+        else:
+            metrics.incr(f"cache.{self.name}.stale_set")
+
+    async def delete(self, key):
+        self.local.delete(key)
+        metrics.incr(f"cache.{self.name}.invalidate")
+
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                self._invalidate(pipe, key)
+                await pipe.execute()
+        except RedisError:
+            logger.error("Redis Exc: Cannot invalidate cache", exc_info=True)
+
+    def delete_sync(self, client: redis.Redis, *keys):
+        """
+        Инвалидация из задач Celery синхронным клиентом
+        """
+        with client.pipeline(transaction=True) as pipe:
+            for key in keys:
+                self._invalidate(pipe, key)
+            pipe.execute()
+
+    def _invalidate(self, pipe, key):
+        pipe.incr(self.version_key(key))
+        pipe.expire(self.version_key(key), self.ttl)
+        pipe.delete(self.key(key))
@@ -24,6 +24,81 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_DAYS: int
     VERIFICATION_TOKEN_EXPIRE_MINUTES: int
 
+    REFRESH_SESSIONS_IN_REDIS: bool = False
+
+    TIMELINE_MAX_SIZE: int = 800
+    TIMELINE_TTL_DAYS: int = 7
+    TIMELINE_FANOUT_MAX_FOLLOWERS: int = 10000
+
+    TRENDING_MAX_TAGS: int = 10000
+
+    LIKES_WRITE_BEHIND: bool = False
+    LIKES_FLUSH_INTERVAL_SECONDS: int = 10
+    LIKES_FLUSH_LOCK_SECONDS: int = 60
+    LIKES_FLUSH_BATCH_RETENTION_DAYS: int = 7
+
+    POST_CACHE_TTL_SECONDS: int = 300
+    POST_CACHE_LOCAL_TTL_SECONDS: int = 5
+    POST_CACHE_MAX_SIZE: int = 1024
+
+    POSTS_BATCH_MAX_SIZE: int = 100
+
+    PROFILE_PAGE_SIZE: int = 10
+    PROFILE_CARD_CACHE_TTL_SECONDS: int = 300
+    PROFILE_CARD_CACHE_LOCAL_TTL_SECONDS: int = 5
+    PROFILE_CARD_CACHE_MAX_SIZE: int = 1024
+
+    FOLLOW_GRAPH_REBUILD_SECONDS: int = 300
+    FOLLOW_GRAPH_LOAD_CHUNK_SIZE: int = 50000
+
+    RELATIONSHIPS_CACHE_MAX_SET: int = 5000
+    RELATIONSHIPS_CACHE_TTL_SECONDS: int = 3600
+
+    VERIFICATION_SWEEP_INTERVAL_SECONDS: int = 60 * 60
+    VERIFICATION_SWEEP_BATCH_SIZE: int = 500
+    VERIFICATION_SWEEP_MAX_BATCHES: int = 100
+
+    # {политика: (емкость корзины, токенов в секунду)}
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: dict[str, tuple[int, float]] = {
+        "login": (10, 0.2),
+        "register": (5, 0.05),
+        "create_post": (30, 0.5),
+        "like_post": (60, 2.0),
+    }
+    DB_POOL_SHED_WAIT_SECONDS: float = 0.5
+    DB_POOL_SHED_WINDOW_SECONDS: float = 1.0
+
+    IMAGE_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    IMAGE_MAX_PIXELS: int = 40_000_000
+    IMAGE_MAX_SIDE: int = 2048
+    IMAGE_QUALITY: int = 50
+    # {вариант: максимальная сторона}
+    IMAGE_VARIANTS: dict[str, int] = {"thumbnail": 160, "medium": 640, "large": 1280}
+    MEDIA_MAX_AGE_SECONDS: int = 60 * 60
+    MEDIA_METADATA_CACHE_SIZE: int = 10000
+    MEDIA_METADATA_CACHE_TTL_SECONDS: int = 60
+    MEDIA_SENDFILE_MIN_BYTES: int = 256 * 1024
+
+    UPLOAD_GC_INTERVAL_SECONDS: int = 6 * 60 * 60
+    UPLOAD_GC_GRACE_SECONDS: int = 24 * 60 * 60
+    UPLOAD_GC_BATCH_SIZE: int = 500
+    UPLOAD_GC_DRY_RUN: bool = False
+
+    IMAGE_PROCESS_WORKERS: int = 2
+    IMAGE_PROCESS_MAX_CONCURRENCY: int = 8
+
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 32
+
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_LOCAL_TTL_SECONDS: int = 2
+    PRINCIPAL_CACHE_MAX_SIZE: int = 4096
+
+    COUNTERS_RECONCILE_CHUNK_SIZE: int = 1000
+    COUNTERS_RECONCILE_INTERVAL_SECONDS: int = 300
+    COUNTERS_FULL_RECONCILE_INTERVAL_SECONDS: int = 24 * 60 * 60
+
     @property
     def DATABASE_URL(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
@@ -0,0 +1,27 @@
+import redis
+from redis.exceptions import RedisError
+
+from app.logger import logger
+from app.redis_client import redis_client
+
+
+TOUCHED_USERS_KEY = "counters:touched:user"
+TOUCHED_POSTS_KEY = "counters:touched:post"
+
+
+class TouchedCounters:
+    """
+    Id строк, чьи денормализованные счетчики недавно менялись: SET в Redis,
+    который разбирает инкрементальная сверка счетчиков
+    """
+
+    @classmethod
+    async def mark(cls, key: str, *ids: int):
+        try:
+            await redis_client.sadd(key, *ids)
+        except RedisError:
+            logger.error("Redis Exc: Cannot mark touched counters", exc_info=True)
+
+    @classmethod
+    def take(cls, client: redis.Redis, key: str, count: int) -> list[int]:
+        return [int(row_id) for row_id in client.spop(key, count) or []]
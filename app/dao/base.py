@@ -1,4 +1,4 @@
-from sqlalchemy import select, insert, delete, update
+from sqlalchemy import select, insert, delete, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from typing import Any, Dict, List
@@ -42,6 +42,35 @@ class BaseDAO:
         query = delete(cls.model).filter_by(**filter_by)
         await session.execute(query)
 
+    @classmethod
+    async def db_get_max_id(cls, session: AsyncSession) -> int:
+        result = await session.execute(select(func.max(cls.model.id)))
+        return result.scalar() or 0
+
+    @classmethod
+    async def db_reconcile_count(cls, session: AsyncSession, counter, source, *where) -> list[int]:
+        """
+        Пересчитывает денормализованный счетчик counter по ссылающейся на id колонке source
+        одним UPDATE ... FROM (SELECT id, count(...) ... GROUP BY id) для строк, попавших под where.
+        Возвращает id исправленных строк
+        """
+        counts = (
+            select(cls.model.id, func.count(source).label("count"))
+            .select_from(cls.model)
+            .outerjoin(source.table, source == cls.model.id)
+            .where(*where)
+            .group_by(cls.model.id)
+            .subquery("counts")
+        )
+        query = (
+            update(cls.model)
+            .where(cls.model.id == counts.c.id, counter.is_distinct_from(counts.c.count))
+            .values({counter.key: counts.c.count})
+            .returning(cls.model.id)
+        )
+        result = await session.execute(query)
+        return result.scalars().all()
+
     @classmethod
     async def add_many(cls, session: AsyncSession, data: List[Dict[str, Any]]):
         """
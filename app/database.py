@@ -1,19 +1,58 @@
+import time
 from typing import Annotated
 from datetime import datetime
 
-from sqlalchemy import func, TIMESTAMP
+from sqlalchemy import func, TIMESTAMP, NullPool, AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, mapped_column
 
 from app.config import settings
+from app.metrics import metrics
 
 
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_async_engine(DATABASE_URL)
+
+class PoolWaitMonitor:
+    """
+    Время ожидания соединения из пула. Если недавно ожидание превысило порог,
+    пул считается перегруженным и лимитер сбрасывает нагрузку
+    """
+
+    def __init__(self):
+        self.overloaded_until = 0.0
+
+    def observe(self, seconds: float):
+        metrics.observe("db.pool_wait", seconds)
+
+        if seconds > settings.DB_POOL_SHED_WAIT_SECONDS:
+            self.overloaded_until = time.monotonic() + settings.DB_POOL_SHED_WINDOW_SECONDS
+
+    def overloaded(self) -> bool:
+        return time.monotonic() < self.overloaded_until
+
+
+pool_wait_monitor = PoolWaitMonitor()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_monitor.observe(time.perf_counter() - start)
+
+
+engine = create_async_engine(DATABASE_URL, poolclass=TimedQueuePool)
 
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+# Для задач Celery: каждая задача запускается в своем event loop, поэтому соединения не переиспользуем
+engine_nullpool = create_async_engine(DATABASE_URL, poolclass=NullPool)
+
+async_session_maker_nullpool = async_sessionmaker(engine_nullpool, expire_on_commit=False)
+
 intpk = Annotated[int, mapped_column(primary_key=True, index=True)]
 
 created_at = Annotated[datetime, mapped_column(TIMESTAMP(timezone=True), server_default=func.now())]
@@ -76,3 +76,38 @@ class NotVerifyUser(BaseExistsException):
 
 class UserIsNotPresentException(BaseExistsException):
     status_code = status.HTTP_401_UNAUTHORIZED
+
+
+class IncorrectCursorException(BaseExistsException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    detail = "Неверный курсор"
+
+
+class IncorrectPostIdsException(BaseExistsException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    detail = "Неверный список id постов"
+
+
+class TooManyRequestsException(BaseExistsException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    detail = "Слишком много запросов"
+
+    def __init__(self, retry_after: int = 1):
+        HTTPException.__init__(
+            self, status_code=self.status_code, detail=self.detail, headers={"Retry-After": str(retry_after)}
+        )
+
+
+class ServiceOverloadedException(BaseExistsException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    detail = "Сервис перегружен, повторите запрос позже"
+
+
+class ImageTooLargeException(BaseExistsException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    detail = "Изображение слишком большое"
+
+
+class IncorrectImageException(BaseExistsException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    detail = "Файл не является изображением"
@@ -1,23 +1,239 @@
+import asyncio
+import hashlib
+import io
 import os
-import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
 from fastapi import UploadFile, File
-from datetime import datetime
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.exceptions import ImageTooLargeException, IncorrectImageException
+from app.metrics import metrics
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Запас на заголовки частей multipart сверх размера самого файла
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Пул процессов создается при первой загрузке, а не при импорте (импортируют и воркеры Celery)
+executor: Optional[ProcessPoolExecutor] = None
+semaphore = asyncio.Semaphore(settings.IMAGE_PROCESS_MAX_CONCURRENCY)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global executor
+
+    if executor is None:
+        executor = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+
+    return executor
+
 
+class EncodedImage(NamedTuple):
+    content_hash: str
+    data: bytes
 
-async def image_add_origin(folder: str, image: UploadFile = File(...)) -> str:
-    """ Загрузка фотографий
+
+def encode_image(data: bytes, max_pixels: int, max_side: int, quality: int) -> tuple[bytes, dict[str, float]]:
+    """ Декодирование и кодирование в WebP, выполняется в пуле процессов. Возвращает WebP и время этапов
     """
-    data = str(datetime.now()).replace(" ", "")
-    data = re.sub(r"[^\w\s]", "", data)
-    image = Image.open(image.file)
+    started_at = time.perf_counter()
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError:
+        raise OverflowError("too many pixels")
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ValueError("unsupported image")
+
+    # Размер известен из заголовка, до декодирования пикселей
+    if image.width * image.height > max_pixels:
+        raise OverflowError("too many pixels")
+
+    output = io.BytesIO()
+
+    try:
+        # JPEG можно сразу декодировать с уменьшением в 2/4/8 раз
+        image.draft("RGB", (max_side, max_side))
+        image.load()
+        image.thumbnail((max_side, max_side))
+        decoded_at = time.perf_counter()
+
+        image.save(output, format="Webp", quality=quality, optimize=True)
+    except Image.DecompressionBombError:
+        raise OverflowError("too many pixels")
+    except (OSError, SyntaxError, ValueError):
+        # Обрезанный или поврежденный файл проявляется только при декодировании
+        raise ValueError("broken image")
+
+    return output.getvalue(), {"decode": decoded_at - started_at, "encode": time.perf_counter() - decoded_at}
+
+
+def image_relative_path(prefix: str, content_hash: str) -> str:
+    """ Путь по хэшу содержимого с шардированием по первым байтам: /post_images/ab/cd/abcd....webp.
+    Содержимое по такому пути никогда не меняется
+    """
+    return f"{prefix}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.webp"
+
+
+@contextmanager
+def atomic_file(path_image: str):
+    """ Атомарная запись: пишем во временный файл рядом и переименовываем,
+    файл появляется целиком или не появляется вовсе
+    """
+    folder = os.path.dirname(path_image)
+    os.makedirs(folder, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, "wb") as file:
+            yield file
+
+        os.replace(tmp_path, path_image)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_if_absent(path_image: str, data: bytes) -> bool:
+    if os.path.exists(path_image):
+        return False
+
+    with atomic_file(path_image) as file:
+        file.write(data)
+
+    return True
+
+
+def create_variants(path_image: str, sizes: dict[str, int], quality: int) -> dict[str, str]:
+    """ Уменьшенные копии рядом с оригиналом: {вариант: имя файла}.
+    Если оригинал не больше варианта, вариант ссылается на сам оригинал
+    """
+    folder, filename = os.path.split(path_image)
+    stem = os.path.splitext(filename)[0]
+    variants = {}
+
+    with Image.open(path_image) as image:
+        image.load()
+
+        for name, side in sorted(sizes.items(), key=lambda item: -item[1]):
+            if max(image.size) <= side:
+                variants[name] = filename
+                continue
+
+            variants[name] = f"{stem}_{name}.webp"
 
-    filename = f"{data}.webp"
-    path_image = os.path.join(folder, filename)
+            # Одинаковые картинки делят файл, а значит и уже созданные варианты
+            if os.path.exists(os.path.join(folder, variants[name])):
+                continue
 
-    if not os.path.exists(folder):
-        os.makedirs(folder)
+            variant = image.copy()
+            variant.thumbnail((side, side))
 
-    image.save(path_image, format="Webp", quality=50, optimize=True)
+            # Имя варианта неизменяемое и отдается с immutable-кэшированием: недописанный файл недопустим
+            with atomic_file(os.path.join(folder, variants[name])) as file:
+                variant.save(file, format="Webp", quality=quality, optimize=True)
+
+    return variants
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Лимит тела запросов загрузки изображений до разбора multipart: иначе Starlette сначала
+    сохраняет все тело во временный файл. Отказ сразу по Content-Length, без него - как только
+    прочитано больше лимита
+    """
+
+    def __init__(self, app: ASGIApp, paths: set[str], max_body_bytes: int):
+        self.app = app
+        self.paths = paths
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length", "")
+
+        if content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            response = JSONResponse({"detail": ImageTooLargeException.detail}, ImageTooLargeException.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+
+            message = await receive()
+
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+
+                if received > self.max_body_bytes:
+                    raise ImageTooLargeException
+
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(image: UploadFile) -> bytes:
+    """ Читаем загрузку по частям, обрывая ее при превышении лимита
+    """
+    chunks, size = [], 0
+
+    while chunk := await image.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+
+        if size > settings.IMAGE_MAX_UPLOAD_BYTES:
+            raise ImageTooLargeException
+
+        chunks.append(chunk)
+
+    return b"".join(chunks)
+
+
+async def image_encode_upload(image: UploadFile = File(...)) -> EncodedImage:
+    """ Загрузка фотографий: чтение с лимитом, перекодирование в пуле процессов и хэш содержимого
+    """
+    with metrics.timer("image.read"):
+        content = await read_upload(image)
+
+    submitted_at = time.perf_counter()
+
+    async with semaphore:
+        metrics.observe("image.queue", time.perf_counter() - submitted_at)
+
+        try:
+            data, timings = await asyncio.get_running_loop().run_in_executor(
+                get_executor(), encode_image, content,
+                settings.IMAGE_MAX_PIXELS, settings.IMAGE_MAX_SIDE, settings.IMAGE_QUALITY
+            )
+        except OverflowError:
+            raise ImageTooLargeException
+        except ValueError:
+            raise IncorrectImageException
+
+    for stage, seconds in timings.items():
+        metrics.observe(f"image.{stage}", seconds)
+
+    return EncodedImage(hashlib.sha256(data).hexdigest(), data)
+
+
+async def image_store(relative_path: str, data: bytes):
+    """ Пишем файл после фиксации ссылки на него в БД: сборщик мусора не удалит его из-под новой ссылки
+    """
+    with metrics.timer("image.write"):
+        written = await asyncio.to_thread(write_if_absent, f"app/static{relative_path}", data)
 
-    return filename
+    metrics.incr("image.stored" if written else "image.deduplicated")
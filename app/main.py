@@ -1,17 +1,31 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.staticfiles import StaticFiles
+from redis.exceptions import RedisError
 from sqladmin import Admin
 
 from app.activity.router import router_activity
 from app.admin.auth import authentication_backend
 from app.admin.views import UserAdmin
+from app.config import settings
 from app.database import engine
+from app.image_utils import UploadSizeLimitMiddleware, UPLOAD_FORM_OVERHEAD_BYTES
+from app.logger import logger
+from app.media import MediaFiles
+from app.metrics import metrics, Metrics, TASK_METRICS_KEY
 from app.post.router import router_post
 from app.profile.router import router_profile
+from app.redis_client import redis_client
+from app.user.dependencies import get_current_superuser
+from app.user.models import User
 from app.user.router import router_auth, router_user
 
 app = FastAPI(title="SocialNet")
 
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    paths={"/posts/post-image", "/user/upload-image"},
+    max_body_bytes=settings.IMAGE_MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES
+)
 
 app.include_router(router_auth)
 app.include_router(router_user)
@@ -19,12 +33,33 @@ app.include_router(router_post)
 app.include_router(router_activity)
 app.include_router(router_profile)
 
+
+@app.get("/metrics", tags=["Метрики"])
+async def get_metrics(current_superuser: User = Depends(get_current_superuser)) -> dict:
+    """
+    Метрики этого процесса и суммарные метрики воркеров Celery
+    """
+    snapshot = metrics.snapshot()
+
+    try:
+        snapshot["tasks"] = Metrics.parse(await redis_client.hgetall(TASK_METRICS_KEY))
+    except RedisError:
+        logger.error("Redis Exc: Cannot read task metrics", exc_info=True)
+
+    return snapshot
+
+
 # Админка
 
 admin = Admin(app, engine, authentication_backend=authentication_backend)
 
 admin.add_view(UserAdmin)
 
+# Загруженные изображения: immutable-кэширование, ETag, Range
+
+app.mount("/static/post_images", MediaFiles(directory="app/static/post_images"), "post_images")
+app.mount("/static/user_images", MediaFiles(directory="app/static/user_images"), "user_images")
+
 # Путь к папке static (frontend)
 
 app.mount("/static", StaticFiles(directory="app/static"), "static")
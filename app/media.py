@@ -0,0 +1,195 @@
+import os
+import re
+import stat
+from email.utils import formatdate
+from mimetypes import guess_type
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope, Receive, Send
+
+from app.cache import LRUCache
+from app.config import settings
+from app.metrics import metrics
+
+# Имя по хэшу содержимого (и его варианты): содержимое по такому адресу никогда не меняется
+HASHED_NAME = re.compile(r"^([0-9a-f]{64}(?:_[a-z]+)?)\.webp$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(value: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """ Один диапазон bytes=start-end, bytes=start- или bytes=-suffix. Возвращает [start, end)
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", (value or "").strip())
+
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+
+    start, end = match.groups()
+
+    if start == "":
+        return max(size - int(end), 0), size
+
+    return int(start), min(int(end) + 1, size) if end else size
+
+
+class MediaFileResponse(Response):
+    """
+    Файл целиком или диапазон. Если сервер поддерживает расширение ASGI zerocopysend,
+    большие файлы отдаются через sendfile, иначе - чтением по частям в потоке
+    """
+
+    def __init__(self, path: str, start: int, end: int, headers: dict, status_code: int = 200, send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.send_body = send_body
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            file = await anyio.open_file(self.path, "rb")
+        except FileNotFoundError:
+            await Response(status_code=404)(scope, receive, send)
+            return
+
+        async with file:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+            length = self.end - self.start
+
+            if not self.send_body or not length:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+
+            zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+
+            if zero_copy and length >= settings.MEDIA_SENDFILE_MIN_BYTES:
+                metrics.incr("media.sendfile")
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.wrapped.fileno(),
+                    "offset": self.start,
+                    "count": length,
+                    "more_body": False
+                })
+                return
+
+            await file.seek(self.start)
+            remaining = length
+
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+
+                if not chunk:
+                    break
+
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class MediaFiles(StaticFiles):
+    """
+    Раздача загруженных изображений: сильные ETag и immutable-кэширование для файлов с хэшем в имени,
+    304 без обращения к диску, Range-запросы и кэш метаданных вместо stat на каждый запрос
+    """
+
+    def __init__(self, directory: str):
+        super().__init__(directory=directory)
+        self.metadata = LRUCache(settings.MEDIA_METADATA_CACHE_SIZE, settings.MEDIA_METADATA_CACHE_TTL_SECONDS)
+
+    @staticmethod
+    def is_not_modified_etag(etag: str, request_headers: Headers) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+
+        if not if_none_match:
+            return False
+
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+        return "*" in tags or etag in tags
+
+    async def lookup_metadata(self, path: str, etag: Optional[str]) -> tuple[str, int, str, str]:
+        metadata = self.metadata.get(path)
+
+        if metadata is not None:
+            metrics.incr("media.metadata.hit")
+            return metadata
+
+        metrics.incr("media.metadata.miss")
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404)
+
+        metadata = (
+            full_path,
+            stat_result.st_size,
+            etag or f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"',
+            formatdate(stat_result.st_mtime, usegmt=True)
+        )
+        self.metadata.set(path, metadata)
+
+        return metadata
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+
+        request_headers = Headers(scope=scope)
+        hashed = HASHED_NAME.match(os.path.basename(path))
+
+        if hashed:
+            etag = f'"{hashed.group(1)}"'
+            cache_control = IMMUTABLE_CACHE_CONTROL
+
+            # ETag известен из имени файла: 304 отдаем, не трогая диск
+            if self.is_not_modified_etag(etag, request_headers):
+                metrics.incr("media.not_modified")
+                return Response(status_code=304, headers={"etag": etag, "cache-control": cache_control})
+        else:
+            etag = None
+            cache_control = f"public, max-age={settings.MEDIA_MAX_AGE_SECONDS}"
+
+        full_path, size, etag, last_modified = await self.lookup_metadata(path, etag)
+
+        headers = {
+            "etag": etag,
+            "cache-control": cache_control,
+            "last-modified": last_modified,
+            "accept-ranges": "bytes",
+            "content-type": guess_type(full_path)[0] or "application/octet-stream",
+        }
+
+        if self.is_not_modified_etag(etag, request_headers):
+            metrics.incr("media.not_modified")
+            return Response(status_code=304, headers={"etag": etag, "cache-control": cache_control})
+
+        send_body = scope["method"] == "GET"
+        byte_range = None
+
+        if request_headers.get("if-range", etag) == etag:
+            byte_range = parse_range(request_headers.get("range"), size)
+
+        if byte_range is None:
+            headers["content-length"] = str(size)
+            return MediaFileResponse(full_path, 0, size, headers, send_body=send_body)
+
+        start, end = byte_range
+
+        if start >= end:
+            return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+
+        headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+        headers["content-length"] = str(end - start)
+
+        return MediaFileResponse(full_path, start, end, headers, status_code=206, send_body=send_body)
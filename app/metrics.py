@@ -0,0 +1,92 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import redis
+
+
+# Метрики воркеров Celery: процессы воркеров сбрасывают сюда накопленное, /metrics приложения читает
+TASK_METRICS_KEY = "metrics:tasks"
+
+# Максимум тайминга обновляем только в сторону увеличения
+SET_MAX_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if tonumber(ARGV[2]) > current then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+end
+return 1
+"""
+
+
+class Metrics:
+    """
+    Счетчики и тайминги процесса: кэши, пулы, фоновые задачи
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.timings = {}
+
+    def incr(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        timing = self.timings.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["sum"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "timings": {name: dict(timing) for name, timing in self.timings.items()}
+        }
+
+    def push(self, client: redis.Redis, key: str = TASK_METRICS_KEY):
+        """
+        Переносим накопленное процессом в общий HASH Redis и обнуляем локальные значения
+        """
+        set_max = client.register_script(SET_MAX_SCRIPT)
+
+        with client.pipeline(transaction=False) as pipe:
+            for name, value in self.counters.items():
+                pipe.hincrby(key, f"counters:{name}", value)
+
+            for name, timing in self.timings.items():
+                pipe.hincrby(key, f"timings:{name}:count", timing["count"])
+                pipe.hincrbyfloat(key, f"timings:{name}:sum", timing["sum"])
+                set_max(keys=[key], args=[f"timings:{name}:max", timing["max"]], client=pipe)
+
+            pipe.execute()
+
+        self.counters.clear()
+        self.timings.clear()
+
+    @classmethod
+    def parse(cls, fields: dict[str, str]) -> dict:
+        """
+        Обратно из HASH в вид snapshot()
+        """
+        result = {"counters": {}, "timings": {}}
+
+        for field, value in fields.items():
+            kind, name = field.split(":", 1)
+
+            if kind == "counters":
+                result["counters"][name] = int(value)
+            else:
+                name, stat = name.rsplit(":", 1)
+                result["timings"].setdefault(name, {})[stat] = int(value) if stat == "count" else float(value)
+
+        return result
+
+
+metrics = Metrics()
@@ -0,0 +1,35 @@
+"""Content addressed image files
+
+Revision ID: 2f6a8d4b0e17
+Revises: 9c4d2e7a1f36
+Create Date: 2026-10-18 19:12:07.887078
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f6a8d4b0e17'
+down_revision: Union[str, None] = '9c4d2e7a1f36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('image_file',
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('content_hash', sa.String(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('path')
+    )
+    op.create_index(op.f('ix_image_file_content_hash'), 'image_file', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_image_file_content_hash'), table_name='image_file')
+    op.drop_table('image_file')
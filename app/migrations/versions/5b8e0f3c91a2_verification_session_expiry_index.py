@@ -0,0 +1,33 @@
+"""Verification session expiry index
+
+Revision ID: 5b8e0f3c91a2
+Revises: 7d2a41c9e605
+Create Date: 2026-10-18 19:08:21.492304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e0f3c91a2'
+down_revision: Union[str, None] = '7d2a41c9e605'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_verification_session_user_id'), 'verification_session', ['user_id'], unique=False)
+    op.create_index(
+        'ix_verification_session_expires_at',
+        'verification_session',
+        [sa.text("(timezone('UTC', created_at) + expires_in * interval '1 second')")],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_verification_session_expires_at', table_name='verification_session')
+    op.drop_index(op.f('ix_verification_session_user_id'), table_name='verification_session')
@@ -0,0 +1,32 @@
+"""Upload garbage collection
+
+Revision ID: 6e1b7c3d9a04
+Revises: 2f6a8d4b0e17
+Create Date: 2026-10-18 19:14:49.866467
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e1b7c3d9a04'
+down_revision: Union[str, None] = '2f6a8d4b0e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('post_image', sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.create_index(op.f('ix_post_image_image'), 'post_image', ['image'], unique=False)
+    op.create_index(op.f('ix_post_image_id'), 'post', ['image_id'], unique=False)
+    op.create_index(op.f('ix_user_image'), 'user', ['image'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_image'), table_name='user')
+    op.drop_index(op.f('ix_post_image_id'), table_name='post')
+    op.drop_index(op.f('ix_post_image_image'), table_name='post_image')
+    op.drop_column('post_image', 'created_at')
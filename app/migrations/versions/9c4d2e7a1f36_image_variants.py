@@ -0,0 +1,29 @@
+"""Image variants
+
+Revision ID: 9c4d2e7a1f36
+Revises: 5b8e0f3c91a2
+Create Date: 2026-10-18 19:10:51.952457
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4d2e7a1f36'
+down_revision: Union[str, None] = '5b8e0f3c91a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('post_image', sa.Column('variants', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('user', sa.Column('image_variants', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'image_variants')
+    op.drop_column('post_image', 'variants')
@@ -0,0 +1,32 @@
+"""Like flush batches
+
+Revision ID: a3f5c8e21d47
+Revises: 6e1b7c3d9a04
+Create Date: 2026-10-18 20:41:07.318254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f5c8e21d47'
+down_revision: Union[str, None] = '6e1b7c3d9a04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('like_flush_batch',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_like_flush_batch_created_at', 'like_flush_batch', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_like_flush_batch_created_at', table_name='like_flush_batch')
+    op.drop_table('like_flush_batch')
@@ -0,0 +1,43 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+from app.exceptions import IncorrectCursorException
+
+
+def encode_cursor(*values) -> str:
+    """ Упаковываем значения ключа сортировки в непрозрачный курсор
+    """
+    raw = json.dumps(values, separators=(",", ":"), default=str)
+
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """ Распаковываем курсор, проверяя количество значений
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError):
+        raise IncorrectCursorException
+
+    if not isinstance(values, list) or len(values) != size:
+        raise IncorrectCursorException
+
+    return values
+
+
+def decode_id_cursor(cursor: Optional[str]) -> Optional[int]:
+    """ Курсор из одного целочисленного id
+    """
+    if not cursor:
+        return None
+
+    (value,) = decode_cursor(cursor, 1)
+
+    if not isinstance(value, int):
+        raise IncorrectCursorException
+
+    return value
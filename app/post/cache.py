@@ -0,0 +1,11 @@
+from app.cache import RedisLRUCache
+from app.config import settings
+
+
+# Сериализованный SPostDetail по id поста, без списка лайкнувших
+post_cache = RedisLRUCache(
+    "post",
+    ttl=settings.POST_CACHE_TTL_SECONDS,
+    local_ttl=settings.POST_CACHE_LOCAL_TTL_SECONDS,
+    max_size=settings.POST_CACHE_MAX_SIZE
+)
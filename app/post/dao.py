@@ -1,11 +1,18 @@
 from app.dao.base import BaseDAO
-from app.post.models import Post, PostImage, Hashtag, PostHashtagAssociation
+from app.post.models import (
+    Post, PostImage, Hashtag, PostHashtagAssociation, PostLikesAssociation, ImageFile, LikeFlushBatch
+)
 
-from sqlalchemy import select, func
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, tuple_, or_, update, union_all, delete, values, column, Integer, func, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.orm import selectinload, joinedload, load_only
 
-from app.user.models import User
+from app.user.models import User, Follow
 
 
 class PostDAO(BaseDAO):
@@ -24,26 +31,30 @@ class PostDAO(BaseDAO):
         result = await session.execute(query)
         return result.scalars().all()
 
+    @classmethod
+    async def db_get_user_posts_page(cls, session: AsyncSession, user_id: int, max_id: Optional[int], limit: int):
+        query = select(cls.model).filter_by(user_id=user_id)
+
+        if max_id:
+            query = query.where(cls.model.id < max_id)
+
+        query = query.order_by(cls.model.id.desc()).limit(limit)
+
+        result = await session.execute(query)
+        return result.scalars().all()
+
     @classmethod
     async def db_get_post_by_id(cls, session: AsyncSession, post_id: int):
         query = (
             select(cls.model)
             .options(joinedload(cls.model.image))
             .options(selectinload(cls.model.hashtags))
-            .options(selectinload(cls.model.liked_by_users))
             .options(joinedload(cls.model.user))
             .filter_by(id=post_id)
         )
         result = await session.execute(query)
         return result.scalars().one_or_none()
 
-    @classmethod
-    async def db_total_posts(cls, session: AsyncSession):
-        query = select(func.count(cls.model.id))
-        result = await session.execute(query)
-        result: int = result.scalar()
-        return result
-
     @classmethod
     async def db_get_posts_join_user(cls, session: AsyncSession, offset: int, limit: int = 10, hashtag: str = None):
         posts_for_users = (
@@ -71,23 +82,561 @@ class PostDAO(BaseDAO):
         result = await session.execute(posts)
         return result.mappings().all()
 
+    @classmethod
+    async def db_get_posts_join_user_by_cursor(
+            cls,
+            session: AsyncSession,
+            limit: int = 10,
+            created_at: Optional[datetime] = None,
+            post_id: Optional[int] = None,
+            hashtag: str = None
+    ):
+        """
+        Keyset-пагинация: ищем посты строго после (created_at, id) по индексу ix_post_created_at_id
+        """
+        query = (
+            select(
+                cls.model.__table__.columns,
+                User.first_name
+            )
+            .join(User, User.id == cls.model.user_id, isouter=True)
+        )
+
+        if hashtag:
+            query = (
+                query
+                .join(PostHashtagAssociation, PostHashtagAssociation.post_id == cls.model.id)
+                .join(Hashtag, Hashtag.id == PostHashtagAssociation.hashtag_id)
+                .where(Hashtag.name == hashtag)
+            )
+
+        if created_at is not None:
+            query = query.where(tuple_(cls.model.created_at, cls.model.id) < tuple_(created_at, post_id))
+
+        query = query.order_by(cls.model.created_at.desc(), cls.model.id.desc()).limit(limit)
+
+        result = await session.execute(query)
+        return result.mappings().all()
+
+    @classmethod
+    async def db_get_posts_by_ids(cls, session: AsyncSession, post_ids: list[int]):
+        """
+        Посты с картинкой, автором и хэштегами за два запроса независимо от количества id
+        """
+        query = (
+            select(cls.model)
+            .options(joinedload(cls.model.image))
+            .options(joinedload(cls.model.user).load_only(User.id, User.first_name))
+            .options(selectinload(cls.model.hashtags))
+            .where(cls.model.id.in_(post_ids))
+        )
+        result = await session.execute(query)
+        return result.scalars().unique().all()
+
+    @classmethod
+    async def db_like_post(cls, session: AsyncSession, post_id: int, user_id: int, update_count: bool = True):
+        """
+        INSERT ... ON CONFLICT DO NOTHING и likes_count + 1 в одном запросе.
+        При update_count=False счетчик не трогаем (write-behind), а только читаем.
+        Пустой результат - пост уже лайкнут этим пользователем
+        """
+        inserted_like = (
+            pg_insert(PostLikesAssociation)
+            .values(user_id=user_id, post_id=post_id)
+            .on_conflict_do_nothing()
+            .returning(PostLikesAssociation.post_id)
+            .cte("inserted_like")
+        )
+
+        if update_count:
+            query = (
+                update(cls.model)
+                .where(cls.model.id.in_(select(inserted_like.c.post_id)))
+                .where(User.id == cls.model.user_id)
+                .values(likes_count=cls.model.likes_count + 1)
+                .returning(cls.model.id, cls.model.likes_count, cls.model.image_id, User.first_name)
+            )
+        else:
+            query = (
+                select(cls.model.id, cls.model.likes_count, cls.model.image_id, User.first_name)
+                .join(User, User.id == cls.model.user_id)
+                .where(cls.model.id.in_(select(inserted_like.c.post_id)))
+            )
+
+        result = await session.execute(query)
+        return result.mappings().one_or_none()
+
+    @classmethod
+    async def db_unlike_post(cls, session: AsyncSession, post_id: int, user_id: int, update_count: bool = True):
+        """
+        DELETE ... RETURNING и likes_count - 1 в одном запросе.
+        Пустой результат - пост не был лайкнут этим пользователем
+        """
+        deleted_like = (
+            delete(PostLikesAssociation)
+            .filter_by(user_id=user_id, post_id=post_id)
+            .returning(PostLikesAssociation.post_id)
+            .cte("deleted_like")
+        )
+
+        if update_count:
+            query = (
+                update(cls.model)
+                .where(cls.model.id.in_(select(deleted_like.c.post_id)))
+                .values(likes_count=cls.model.likes_count - 1)
+                .returning(cls.model.id, cls.model.likes_count)
+            )
+        else:
+            query = (
+                select(cls.model.id, cls.model.likes_count)
+                .where(cls.model.id.in_(select(deleted_like.c.post_id)))
+            )
+
+        result = await session.execute(query)
+        return result.mappings().one_or_none()
+
+    @classmethod
+    async def db_get_likers(cls, session: AsyncSession, post_id: int, max_user_id: Optional[int], limit: int):
+        """
+        Окно лайкнувших пост пользователей по индексу (post_id, user_id), только нужные колонки
+        """
+        query = (
+            select(User.id, User.first_name)
+            .join(PostLikesAssociation, PostLikesAssociation.user_id == User.id)
+            .where(PostLikesAssociation.post_id == post_id)
+        )
+
+        if max_user_id:
+            query = query.where(PostLikesAssociation.user_id < max_user_id)
+
+        query = query.order_by(PostLikesAssociation.user_id.desc()).limit(limit)
+
+        result = await session.execute(query)
+        return result.mappings().all()
+
+    @classmethod
+    async def db_get_likes_count(cls, session: AsyncSession, post_id: int) -> Optional[int]:
+        query = select(cls.model.likes_count).filter_by(id=post_id)
+        result = await session.execute(query)
+        return result.scalar_one_or_none()
+
+    @classmethod
+    async def db_add_likes_count(cls, session: AsyncSession, deltas: dict[int, int]):
+        """
+        Применяем накопленные дельты лайков одним UPDATE ... FROM (VALUES ...)
+        """
+        deltas_values = (
+            values(column("id", Integer), column("delta", Integer), name="deltas", literal_binds=True)
+            .data(list(deltas.items()))
+        )
+        query = (
+            update(cls.model)
+            .where(cls.model.id == deltas_values.c.id)
+            .values(likes_count=cls.model.likes_count + deltas_values.c.delta)
+        )
+        await session.execute(query)
+
+    @classmethod
+    async def db_get_post_ids_by_image(cls, session: AsyncSession, image_id: int) -> list[int]:
+        query = select(cls.model.id).filter_by(image_id=image_id)
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @classmethod
+    async def db_get_posts_join_user_by_ids(cls, session: AsyncSession, post_ids: list[int]):
+        """
+        Посты с именем автора в порядке переданных id
+        """
+        query = (
+            select(
+                cls.model.__table__.columns,
+                User.first_name
+            )
+            .join(User, User.id == cls.model.user_id, isouter=True)
+            .where(cls.model.id.in_(post_ids))
+        )
+        result = await session.execute(query)
+        posts = {post["id"]: post for post in result.mappings().all()}
+
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+    @classmethod
+    async def db_get_timeline_post_ids(cls, session: AsyncSession, user_id: int, limit: int) -> list[int]:
+        """
+        Собираем холодную домашнюю ленту: свои посты и посты тех, на кого подписан пользователь
+        """
+        following_ids = select(Follow.following_id).where(Follow.follower_id == user_id)
+
+        query = (
+            select(cls.model.id)
+            .where(or_(cls.model.user_id.in_(following_ids), cls.model.user_id == user_id))
+            .order_by(cls.model.id.desc())
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @classmethod
+    async def db_get_timeline_posts(
+            cls,
+            session: AsyncSession,
+            user_id: int,
+            post_ids: list[int],
+            max_id: Optional[int],
+            limit: int,
+            fanout_max_followers: int
+    ):
+        """
+        Гидратация страницы ленты одним запросом: id из Redis плюс pull-посты авторов,
+        для которых fan-out не делается из-за большого числа подписчиков
+        """
+        pulled_authors = (
+            select(Follow.following_id)
+            .join(User, User.id == Follow.following_id)
+            .where(Follow.follower_id == user_id, User.followers_count > fanout_max_followers)
+        )
+
+        query = (
+            select(
+                cls.model.__table__.columns,
+                User.first_name
+            )
+            .join(User, User.id == cls.model.user_id, isouter=True)
+            .where(or_(cls.model.id.in_(post_ids), cls.model.user_id.in_(pulled_authors)))
+        )
+
+        if max_id:
+            query = query.where(cls.model.id < max_id)
+
+        query = query.order_by(cls.model.id.desc()).limit(limit)
+
+        result = await session.execute(query)
+        return result.mappings().all()
+
+
+class LikeFlushBatchDAO(BaseDAO):
+    model = LikeFlushBatch
+
+    @classmethod
+    async def db_mark_applied(cls, session: AsyncSession, batch_id: str) -> bool:
+        """
+        Отмечаем пачку примененной. False - пачку уже применили раньше
+        """
+        query = (
+            pg_insert(cls.model)
+            .values(id=batch_id)
+            .on_conflict_do_nothing(index_elements=[cls.model.id])
+            .returning(cls.model.id)
+        )
+        result = await session.execute(query)
+        return result.scalar_one_or_none() is not None
+
+    @classmethod
+    async def db_delete_older_than(cls, session: AsyncSession, older_than: datetime):
+        query = delete(cls.model).where(cls.model.created_at < older_than)
+        await session.execute(query)
+
+
+class ImageFileDAO(BaseDAO):
+    model = ImageFile
+
+    @classmethod
+    async def db_lock_paths(cls, session: AsyncSession, paths: list[str]):
+        """
+        Advisory-блокировки путей до конца транзакции: новая ссылка на файл и удаление
+        неучтенного файла с диска не пересекаются. Порядок фиксированный - без взаимоблокировок
+        """
+        for path in sorted(set(paths)):
+            await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(path))))
+
+    @classmethod
+    async def db_acquire(cls, session: AsyncSession, path: str, content_hash: str, size: int):
+        """
+        Новая ссылка на файл: первая создает запись, последующие увеличивают ref_count
+        """
+        await cls.db_lock_paths(session, [path])
+
+        query = (
+            pg_insert(cls.model)
+            .values(path=path, content_hash=content_hash, size=size, ref_count=1)
+            .on_conflict_do_update(
+                index_elements=[cls.model.path],
+                set_={"ref_count": cls.model.ref_count + 1}
+            )
+        )
+        await session.execute(query)
+
+    @classmethod
+    async def db_release(cls, session: AsyncSession, path: Optional[str]):
+        """
+        Ссылка на файл пропала. Сам файл с ref_count = 0 удалит сборщик мусора
+        """
+        if not path:
+            return
+
+        query = (
+            update(cls.model)
+            .where(cls.model.path == path, cls.model.ref_count > 0)
+            .values(ref_count=cls.model.ref_count - 1)
+        )
+        await session.execute(query)
+
+    @classmethod
+    async def db_release_user_post_images(cls, session: AsyncSession, user_id: int):
+        """
+        Снимаем ссылки всех картинок постов пользователя перед каскадным удалением его post_image
+        """
+        counts = (
+            select(PostImage.image, func.count().label("count"))
+            .where(PostImage.user_id == user_id, PostImage.image.is_not(None))
+            .group_by(PostImage.image)
+            .subquery("counts")
+        )
+        query = (
+            update(cls.model)
+            .where(cls.model.path == counts.c.image)
+            .values(ref_count=func.greatest(cls.model.ref_count - counts.c.count, 0))
+        )
+        await session.execute(query)
+
+    @classmethod
+    async def db_release_many(cls, session: AsyncSession, paths: list[str]):
+        """
+        Снимаем по ссылке за каждое вхождение пути: одно UPDATE на каждое различное число ссылок
+        """
+        by_count = {}
+
+        for path, count in Counter(paths).items():
+            by_count.setdefault(count, []).append(path)
+
+        for count, group in by_count.items():
+            query = (
+                update(cls.model)
+                .where(cls.model.path.in_(group))
+                .values(ref_count=func.greatest(cls.model.ref_count - count, 0))
+            )
+            await session.execute(query)
+
+    @classmethod
+    async def db_reconcile_ref_counts(
+            cls, session: AsyncSession, after_path: Optional[str], limit: int
+    ) -> tuple[Optional[str], int]:
+        """
+        Пересчитываем ref_count чанка файлов по post_image.image и user.image (каскадные удаления их не снимают).
+        Возвращает последний путь чанка и число исправленных строк
+        """
+        chunk = select(cls.model.path).order_by(cls.model.path).limit(limit)
+
+        if after_path:
+            chunk = chunk.where(cls.model.path > after_path)
+
+        paths = (await session.execute(chunk)).scalars().all()
+
+        if not paths:
+            return None, 0
+
+        references = (
+            select(func.count()).where(PostImage.image == cls.model.path).scalar_subquery()
+            + select(func.count()).where(User.image == cls.model.path).scalar_subquery()
+        )
+        query = (
+            update(cls.model)
+            .where(cls.model.path.in_(paths), cls.model.ref_count != references)
+            .values(ref_count=references)
+            .returning(cls.model.path)
+        )
+        result = await session.execute(query)
+
+        return paths[-1], len(result.all())
+
+    @classmethod
+    def unreferenced_filter(cls, older_than: datetime):
+        return (
+            cls.model.ref_count == 0,
+            cls.model.created_at < older_than,
+            ~exists().where(PostImage.image == cls.model.path),
+            ~exists().where(User.image == cls.model.path),
+        )
+
+    @classmethod
+    async def db_get_unreferenced(
+            cls, session: AsyncSession, older_than: datetime, after_path: Optional[str], limit: int
+    ):
+        query = select(cls.model.path, cls.model.size).where(*cls.unreferenced_filter(older_than))
+
+        if after_path:
+            query = query.where(cls.model.path > after_path)
+
+        result = await session.execute(query.order_by(cls.model.path).limit(limit))
+        return result.all()
+
+    @classmethod
+    async def db_delete_unreferenced(cls, session: AsyncSession, older_than: datetime, limit: int) -> list[str]:
+        """
+        Удаляет записи файлов без ссылок. Строки блокируются до коммита, поэтому одновременная загрузка
+        того же содержимого дождется его и создаст запись заново
+        """
+        paths = (
+            select(cls.model.path)
+            .where(*cls.unreferenced_filter(older_than))
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = delete(cls.model).where(cls.model.path.in_(paths.scalar_subquery())).returning(cls.model.path)
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @classmethod
+    async def db_get_referenced_paths(cls, session: AsyncSession, paths: list[str]) -> set[str]:
+        """
+        Какие из путей известны БД: как файл с хэшем или как старая картинка поста/аватар
+        """
+        query = union_all(
+            select(cls.model.path).where(cls.model.path.in_(paths)),
+            select(PostImage.image).where(PostImage.image.in_(paths)),
+            select(User.image).where(User.image.in_(paths)),
+        )
+        result = await session.execute(query)
+        return set(result.scalars().all())
+
 
 class PostImageDAO(BaseDAO):
     model = PostImage
 
+    @classmethod
+    def orphan_filter(cls, older_than: datetime):
+        """
+        Картинки, загруженные раньше older_than, на которые не ссылается ни один пост
+        """
+        return cls.model.created_at < older_than, ~exists().where(Post.image_id == cls.model.id)
+
+    @classmethod
+    async def db_get_orphans(cls, session: AsyncSession, older_than: datetime, after_id: int, limit: int):
+        query = (
+            select(cls.model.id, cls.model.image, ImageFile.size)
+            .outerjoin(ImageFile, ImageFile.path == cls.model.image)
+            .where(*cls.orphan_filter(older_than), cls.model.id > after_id)
+            .order_by(cls.model.id)
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        return result.all()
+
+    @classmethod
+    async def db_delete_orphans(cls, session: AsyncSession, older_than: datetime, limit: int) -> list[Optional[str]]:
+        ids = select(cls.model.id).where(*cls.orphan_filter(older_than)).limit(limit).with_for_update(skip_locked=True)
+        query = delete(cls.model).where(cls.model.id.in_(ids.scalar_subquery())).returning(cls.model.image)
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @classmethod
+    async def db_set_variants(cls, session: AsyncSession, image_id: int, image: str, variants: dict[str, str]) -> bool:
+        """
+        Записываем варианты, только если за это время картинку не заменили и не удалили
+        """
+        query = (
+            update(cls.model)
+            .where(cls.model.id == image_id, cls.model.image == image)
+            .values(variants=variants)
+            .returning(cls.model.id)
+        )
+        result = await session.execute(query)
+        return result.scalar_one_or_none() is not None
+
 
 class HashtagDAO(BaseDAO):
     model = Hashtag
 
     @classmethod
-    async def db_get_posts_from_hashtag(cls, session: AsyncSession, hashtag_name: str):
+    async def db_get_posting_list(
+            cls, session: AsyncSession, hashtag_id: int, max_id: Optional[int], limit: int
+    ) -> list[int]:
+        query = select(PostHashtagAssociation.post_id).where(PostHashtagAssociation.hashtag_id == hashtag_id)
+
+        if max_id:
+            query = query.where(PostHashtagAssociation.post_id < max_id)
+
+        query = query.order_by(PostHashtagAssociation.post_id.desc()).limit(limit)
+
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @classmethod
+    async def db_get_posting_lists(
+            cls, session: AsyncSession, hashtag_ids: list[int], max_id: Optional[int], limit: int
+    ) -> dict[int, list[int]]:
+        """
+        Начала нескольких posting-листов одним запросом (UNION ALL из диапазонных чтений индекса)
+        """
+        queries = []
+
+        for hashtag_id in hashtag_ids:
+            query = (
+                select(PostHashtagAssociation.hashtag_id, PostHashtagAssociation.post_id)
+                .where(PostHashtagAssociation.hashtag_id == hashtag_id)
+            )
+
+            if max_id:
+                query = query.where(PostHashtagAssociation.post_id < max_id)
+
+            queries.append(query.order_by(PostHashtagAssociation.post_id.desc()).limit(limit))
+
+        result = await session.execute(union_all(*queries))
+
+        lists = {hashtag_id: [] for hashtag_id in hashtag_ids}
+        for hashtag_id, post_id in result.all():
+            lists[hashtag_id].append(post_id)
+
+        for posting_list in lists.values():
+            posting_list.sort(reverse=True)
+
+        return lists
+
+    @classmethod
+    async def db_get_posting_matches(
+            cls, session: AsyncSession, hashtag_ids: list[int], post_ids: list[int]
+    ) -> dict[int, list[int]]:
+        """
+        Какие из post_ids есть в posting-листах хэштегов (точечные чтения по первичному ключу)
+        """
         query = (
-            select(cls.model)
-            .options(selectinload(cls.model.posts))
-            .filter_by(name=hashtag_name)
+            select(PostHashtagAssociation.hashtag_id, PostHashtagAssociation.post_id)
+            .where(PostHashtagAssociation.hashtag_id.in_(hashtag_ids))
+            .where(PostHashtagAssociation.post_id.in_(post_ids))
+            .order_by(PostHashtagAssociation.post_id.desc())
         )
         result = await session.execute(query)
-        return result.scalars().one_or_none()
+
+        matches = {}
+        for hashtag_id, post_id in result.all():
+            matches.setdefault(hashtag_id, []).append(post_id)
+
+        return matches
+
+    @classmethod
+    async def db_increment_posts_count(cls, session: AsyncSession, hashtag_ids: list[int]):
+        query = (
+            update(cls.model)
+            .where(cls.model.id.in_(hashtag_ids))
+            .values(posts_count=cls.model.posts_count + 1)
+        )
+        await session.execute(query)
+
+    @classmethod
+    async def db_decrement_posts_count(cls, session: AsyncSession, post_id: int):
+        """
+        Уменьшаем posts_count хэштегов поста, вызывается до удаления поста
+        """
+        hashtag_ids = (
+            select(PostHashtagAssociation.hashtag_id)
+            .where(PostHashtagAssociation.post_id == post_id)
+        )
+        query = (
+            update(cls.model)
+            .where(cls.model.id.in_(hashtag_ids))
+            .values(posts_count=func.greatest(cls.model.posts_count - 1, 0))
+        )
+        await session.execute(query)
 
     @classmethod
     async def db_one_hashtag_in(cls, session: AsyncSession, names: list):
@@ -0,0 +1,95 @@
+import heapq
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.post.dao import HashtagDAO
+from app.post.models import Hashtag
+
+
+def intersect_desc(first: list[int], *others: list[int]) -> list[int]:
+    """
+    Пересечение списков id, отсортированных по убыванию (два указателя на каждую пару)
+    """
+    result = first
+
+    for other in others:
+        merged = []
+        i, j = 0, 0
+
+        while i < len(result) and j < len(other):
+            if result[i] == other[j]:
+                merged.append(result[i])
+                i += 1
+                j += 1
+            elif result[i] > other[j]:
+                i += 1
+            else:
+                j += 1
+
+        result = merged
+
+    return result
+
+
+def union_desc(*lists: list[int]) -> list[int]:
+    """
+    Объединение списков id, отсортированных по убыванию, без дубликатов
+    """
+    result = []
+
+    for post_id in heapq.merge(*lists, reverse=True):
+        if not result or result[-1] != post_id:
+            result.append(post_id)
+
+    return result
+
+
+class HashtagIndex:
+    """
+    Posting-листы хэштегов: hashtag_id -> id постов по убыванию,
+    читаются по индексу ix_post_hashtag_association_hashtag_id_post_id
+    """
+
+    @classmethod
+    async def get_page_all(
+            cls, session: AsyncSession, hashtags: list[Hashtag], max_id: Optional[int], limit: int
+    ) -> list[int]:
+        """
+        AND: идем по самому короткому списку пачками и проверяем пачку по остальным хэштегам
+        """
+        driver, *others = sorted(hashtags, key=lambda hashtag: hashtag.posts_count)
+        other_ids = [hashtag.id for hashtag in others]
+        batch_size = max(limit * 4, 100) if others else limit
+
+        result = []
+
+        while len(result) < limit:
+            chunk = await HashtagDAO.db_get_posting_list(session, driver.id, max_id, batch_size)
+
+            if not chunk:
+                break
+
+            if other_ids:
+                matches = await HashtagDAO.db_get_posting_matches(session, other_ids, chunk)
+                result += intersect_desc(chunk, *(matches.get(hashtag_id, []) for hashtag_id in other_ids))
+            else:
+                result += chunk
+
+            if len(chunk) < batch_size:
+                break
+
+            max_id = chunk[-1]
+
+        return result[:limit]
+
+    @classmethod
+    async def get_page_any(
+            cls, session: AsyncSession, hashtags: list[Hashtag], max_id: Optional[int], limit: int
+    ) -> list[int]:
+        """
+        OR: берем по limit id из каждого списка и сливаем их
+        """
+        lists = await HashtagDAO.db_get_posting_lists(session, [hashtag.id for hashtag in hashtags], max_id, limit)
+
+        return union_desc(*lists.values())[:limit]
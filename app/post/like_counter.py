@@ -0,0 +1,129 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import redis
+from redis.lock import Lock
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.post.dao import PostDAO, LikeFlushBatchDAO
+from app.redis_client import redis_client
+
+
+PENDING_KEY = "post_likes_delta"
+FLUSHING_KEY = "post_likes_delta:flushing"
+FLUSHING_BATCH_KEY = "post_likes_delta:flushing:batch"
+FLUSH_LOCK_KEY = "post_likes_delta:lock"
+
+# Переносим pending во flushing и выдаем пачке id. Незавершенная пачка возвращается с прежним id
+TAKE_PENDING_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return false
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    redis.call('SET', KEYS[3], ARGV[1])
+end
+local batch_id = redis.call('GET', KEYS[3])
+if not batch_id then
+    batch_id = ARGV[1]
+    redis.call('SET', KEYS[3], batch_id)
+end
+return {batch_id, redis.call('HGETALL', KEYS[2])}
+"""
+
+# Удаляем пачку, только если это все еще она: пачку, взятую после нас, не трогаем
+ACK_SCRIPT = """
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+end
+return 1
+"""
+
+
+class LikeCounter:
+    """
+    Write-behind счетчик лайков: дельты копятся в HASH post_likes_delta {post_id: delta},
+    воркер Celery периодически переносит их в post.likes_count одним UPDATE
+    """
+
+    @classmethod
+    async def add(cls, post_id: int, delta: int) -> int:
+        """
+        Добавляем дельту и возвращаем все еще не перенесенную в БД дельту поста
+        """
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(PENDING_KEY, post_id, delta)
+            pipe.hget(FLUSHING_KEY, post_id)
+            pending, flushing = await pipe.execute()
+
+        return pending + int(flushing or 0)
+
+    @classmethod
+    async def pending(cls, post_ids: list[int]) -> dict[int, int]:
+        if not post_ids:
+            return {}
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hmget(PENDING_KEY, post_ids)
+            pipe.hmget(FLUSHING_KEY, post_ids)
+            pending, flushing = await pipe.execute()
+
+        return {
+            post_id: int(pending_delta or 0) + int(flushing_delta or 0)
+            for post_id, pending_delta, flushing_delta in zip(post_ids, pending, flushing)
+            if pending_delta or flushing_delta
+        }
+
+    @classmethod
+    def take_pending(cls, client: redis.Redis) -> tuple[Optional[str], dict[int, int]]:
+        """
+        Забираем накопленные дельты вместе с id пачки. Если прошлый перенос не завершился, сначала повторяем его
+        """
+        result = client.register_script(TAKE_PENDING_SCRIPT)(
+            keys=[PENDING_KEY, FLUSHING_KEY, FLUSHING_BATCH_KEY], args=[uuid.uuid4().hex]
+        )
+
+        if not result:
+            return None, {}
+
+        batch_id, fields = result
+        deltas = {int(post_id): int(delta) for post_id, delta in zip(fields[::2], fields[1::2]) if int(delta)}
+
+        return batch_id, deltas
+
+    @classmethod
+    def pending_post_ids(cls, client: redis.Redis) -> set[int]:
+        """
+        Посты с еще не перенесенными дельтами: их likes_count в БД временно отстает
+        """
+        return {int(post_id) for key in (PENDING_KEY, FLUSHING_KEY) for post_id in client.hkeys(key)}
+
+    @classmethod
+    def ack(cls, client: redis.Redis, batch_id: str):
+        client.register_script(ACK_SCRIPT)(keys=[FLUSHING_KEY, FLUSHING_BATCH_KEY], args=[batch_id])
+
+    @classmethod
+    def flush_lock(cls, client: redis.Redis) -> Lock:
+        """
+        Один перенос за раз (SET NX PX). Повторное применение пачки все равно отсекает БД
+        """
+        return client.lock(FLUSH_LOCK_KEY, timeout=settings.LIKES_FLUSH_LOCK_SECONDS)
+
+    @classmethod
+    async def apply(cls, session: AsyncSession, batch_id: str, deltas: dict[int, int]) -> bool:
+        """
+        Id пачки записывается в той же транзакции, что и дельты: пачка применяется ровно один раз
+        """
+        applied = await LikeFlushBatchDAO.db_mark_applied(session, batch_id)
+
+        if applied:
+            await PostDAO.db_add_likes_count(session, deltas)
+
+        await LikeFlushBatchDAO.db_delete_older_than(
+            session, datetime.now(timezone.utc) - timedelta(days=settings.LIKES_FLUSH_BATCH_RETENTION_DAYS)
+        )
+        await session.commit()
+
+        return applied
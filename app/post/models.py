@@ -1,12 +1,16 @@
 from typing import Optional
 
 from app.database import Base, intpk, created_at
-from sqlalchemy import ForeignKey, Column, Integer
+from sqlalchemy import ForeignKey, Column, Integer, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 
 class PostHashtagAssociation(Base):
     __tablename__ = "post_hashtag_association"
+    __table_args__ = (
+        Index("ix_post_hashtag_association_hashtag_id_post_id", "hashtag_id", "post_id"),
+    )
 
     post_id = Column(Integer, ForeignKey("post.id", ondelete="CASCADE"), primary_key=True)
     hashtag_id = Column(Integer, ForeignKey("hashtag.id", ondelete="CASCADE"), primary_key=True)
@@ -14,17 +18,49 @@ class PostHashtagAssociation(Base):
 
 class PostLikesAssociation(Base):
     __tablename__ = "post_likes_association"
+    __table_args__ = (
+        Index("ix_post_likes_association_post_id_user_id", "post_id", "user_id"),
+    )
 
     user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
     post_id = Column(Integer, ForeignKey("post.id", ondelete="CASCADE"), primary_key=True)
 
 
+class ImageFile(Base):
+    """
+    Файл изображения, адресуемый хэшем содержимого. ref_count - сколько PostImage и аватаров на него ссылаются
+    """
+    __tablename__ = "image_file"
+
+    path: Mapped[str] = mapped_column(primary_key=True)
+    content_hash: Mapped[str] = mapped_column(index=True)
+    size: Mapped[int]
+    ref_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    created_at: Mapped[created_at]
+
+
+class LikeFlushBatch(Base):
+    """
+    Пачка дельт лайков, уже перенесенная в post.likes_count. Повторный перенос той же пачки пропускается
+    """
+    __tablename__ = "like_flush_batch"
+    __table_args__ = (
+        Index("ix_like_flush_batch_created_at", "created_at"),
+    )
+
+    id: Mapped[str] = mapped_column(primary_key=True)
+    created_at: Mapped[created_at]
+
+
 class PostImage(Base):
     __tablename__ = "post_image"
 
     id: Mapped[intpk]
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"))
-    image: Mapped[Optional[str]]
+    image: Mapped[Optional[str]] = mapped_column(index=True)
+    # {вариант: путь}, заполняется воркером Celery после загрузки
+    variants: Mapped[Optional[dict]] = mapped_column(JSONB)
+    created_at: Mapped[created_at]
 
     post: Mapped["Post"] = relationship(back_populates="image")
 
@@ -34,12 +70,16 @@ class PostImage(Base):
 
 class Post(Base):
     __tablename__ = "post"
+    __table_args__ = (
+        Index("ix_post_created_at_id", "created_at", "id"),
+        Index("ix_post_user_id_id", "user_id", "id"),
+    )
 
     id: Mapped[intpk]
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"))
     title: Mapped[Optional[str]]
     content: Mapped[Optional[str]]
-    image_id: Mapped[Optional[int]] = mapped_column(ForeignKey("post_image.id", ondelete="SET NULL"))
+    image_id: Mapped[Optional[int]] = mapped_column(ForeignKey("post_image.id", ondelete="SET NULL"), index=True)
     created_at: Mapped[created_at]
     likes_count: Mapped[int] = mapped_column(default=0)
 
@@ -59,6 +99,7 @@ class Hashtag(Base):
 
     id: Mapped[intpk]
     name: Mapped[str] = mapped_column(index=True)
+    posts_count: Mapped[int] = mapped_column(default=0, server_default="0")
 
     posts: Mapped[list["Post"]] = relationship(secondary="post_hashtag_association", back_populates="hashtags")
 
@@ -1,15 +1,16 @@
-from typing import Optional, Union
+from typing import Literal, Optional, Union
 
-from fastapi import APIRouter, status, Depends, UploadFile, File
+from fastapi import APIRouter, status, Depends, UploadFile, File, Query
 
 from app.post.schemas import (
     SPostCreate, SPostInfo, SPostImageInfo, SHashtagPosts, SPostRandom,
-    SPostRandomWithPostAssociation
+    SPostRandomWithPostAssociation, SPostFeedPage, STrendingHashtag, SPostLikersPage, SPostLikesSummary,
+    SPostBatch, SPostDetail
 )
 from app.post.services import PostService
+from app.rate_limit import rate_limit
 from app.user.dependencies import get_current_active_user
-from app.user.models import User
-from app.user.schemas import SUserLiked
+from app.user.schemas import SUserLiked, SPrincipal
 
 router_post = APIRouter(
     prefix="/posts",
@@ -17,27 +18,41 @@ router_post = APIRouter(
 )
 
 
-@router_post.post("", status_code=status.HTTP_201_CREATED)
-async def create_post(post: SPostCreate, current_user: User = Depends(get_current_active_user)):
+@router_post.post("", status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("create_post"))])
+async def create_post(post: SPostCreate, current_user: SPrincipal = Depends(get_current_active_user)):
     return await PostService.service_create_post(current_user.id, post)
 
 
 @router_post.post("/post-image", status_code=status.HTTP_201_CREATED)
 async def upload_photo_for_post(
         image: UploadFile = File(...),
-        current_user: User = Depends(get_current_active_user)
+        current_user: SPrincipal = Depends(get_current_active_user)
 ) -> Optional[SPostImageInfo]:
     return await PostService.service_upload_photo_for_post(current_user.id, image)
 
 
 @router_post.get("/all-post-users")
-async def get_user_posts(current_user: User = Depends(get_current_active_user)) -> list[SPostInfo]:
+async def get_user_posts(current_user: SPrincipal = Depends(get_current_active_user)) -> list[SPostInfo]:
     return await PostService.service_get_user_posts(current_user.id)
 
 
 @router_post.get("/hashtag-posts")
-async def get_posts_from_hashtag(hashtag_name: str) -> list[SHashtagPosts]:
-    return await PostService.service_get_posts_from_hashtag(hashtag_name)
+async def get_posts_from_hashtag(hashtag_name: str, limit: int = Query(100, ge=1, le=100)) -> list[SHashtagPosts]:
+    return await PostService.service_get_posts_from_hashtag(hashtag_name, limit)
+
+
+@router_post.get("/hashtags/posts")
+async def get_posts_by_hashtags(
+        tags: str, mode: Literal["and", "or"] = "and", cursor: str = None, limit: int = Query(10, ge=1, le=100)
+) -> SPostFeedPage:
+    return await PostService.service_get_posts_by_hashtags(tags, mode, cursor, limit)
+
+
+@router_post.get("/hashtags/trending")
+async def get_trending_hashtags(
+        window: Literal["hour", "day", "week"] = "day", limit: int = Query(10, ge=1, le=100)
+) -> list[STrendingHashtag]:
+    return await PostService.service_get_trending_hashtags(window, limit)
 
 
 @router_post.get("/feed")
@@ -47,26 +62,58 @@ async def get_random_posts_for_feed(
     return await PostService.service_get_random_posts_for_feed(page, limit, hashtag)
 
 
-@router_post.post("/like", status_code=status.HTTP_201_CREATED)
-async def like_post(post_id: int, current_user: User = Depends(get_current_active_user)):
-    return await PostService.service_like_post(post_id, current_user.first_name)
+@router_post.get("/feed/cursor")
+async def get_posts_for_feed_by_cursor(
+        cursor: str = None, limit: int = Query(10, ge=1, le=100), hashtag: str = None
+) -> SPostFeedPage:
+    return await PostService.service_get_posts_for_feed_by_cursor(cursor, limit, hashtag)
+
+
+@router_post.get("/timeline")
+async def get_home_timeline(
+        cursor: str = None, limit: int = Query(10, ge=1, le=100),
+        current_user: SPrincipal = Depends(get_current_active_user)
+) -> SPostFeedPage:
+    return await PostService.service_get_home_timeline(current_user.id, cursor, limit)
+
+
+@router_post.post("/like", status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("like_post"))])
+async def like_post(post_id: int, current_user: SPrincipal = Depends(get_current_active_user)):
+    return await PostService.service_like_post(post_id, current_user.id, current_user.first_name)
 
 
 @router_post.post("/unlike", status_code=status.HTTP_201_CREATED)
-async def unlike_post(post_id: int, current_user: User = Depends(get_current_active_user)):
-    return await PostService.service_unlike_post(post_id, current_user.first_name)
+async def unlike_post(post_id: int, current_user: SPrincipal = Depends(get_current_active_user)):
+    return await PostService.service_unlike_post(post_id, current_user.id)
 
 
 @router_post.delete("", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_post_by_id(post_id: int, current_user: User = Depends(get_current_active_user)):
+async def delete_post_by_id(post_id: int, current_user: SPrincipal = Depends(get_current_active_user)):
     await PostService.service_delete_post_by_id(post_id, current_user.id)
 
 
 @router_post.get("/liked-post")
-async def liked_users_post(post_id: int) -> list[SUserLiked]:
-    return await PostService.service_liked_users_post(post_id)
+async def liked_users_post(post_id: int, limit: int = Query(100, ge=1, le=100)) -> list[SUserLiked]:
+    return await PostService.service_liked_users_post(post_id, limit)
+
+
+@router_post.get("/likers")
+async def get_post_likers(
+        post_id: int, cursor: str = None, limit: int = Query(20, ge=1, le=100)
+) -> SPostLikersPage:
+    return await PostService.service_get_post_likers(post_id, cursor, limit)
+
+
+@router_post.get("/likes-summary")
+async def get_post_likes_summary(post_id: int) -> SPostLikesSummary:
+    return await PostService.service_get_likes_summary(post_id)
+
+
+@router_post.get("/batch")
+async def get_posts_batch(ids: str) -> SPostBatch:
+    return await PostService.service_get_posts_batch(ids)
 
 
 @router_post.get("/{post_id}")
-async def get_post_by_id(post_id: int) -> Optional[SPostInfo]:
+async def get_post_by_id(post_id: int) -> Optional[SPostDetail]:
     return await PostService.service_get_post_by_id(post_id)
@@ -18,6 +18,7 @@ class SPostImageInfo(BaseModel):
     id: int
     user_id: int
     image: Optional[str]
+    variants: Optional[dict[str, str]] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -29,6 +30,27 @@ class SHashtag(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class STrendingHashtag(BaseModel):
+    name: str
+    count: int
+
+
+class SPostLikeInfo(BaseModel):
+    id: int
+    likes_count: int
+
+
+class SPostLikersPage(BaseModel):
+    users: list[SUserLiked]
+    next_cursor: Optional[str] = None
+
+
+class SPostLikesSummary(BaseModel):
+    likes_count: int
+    users: list[SUserLiked]
+    others_count: int
+
+
 class SHashtagPosts(SPostCreate):
     id: int
     user_id: int
@@ -45,10 +67,30 @@ class SPostRandomWithPostAssociation(SPostRandom):
     hashtag_id: int
 
 
+class SPostFeedPage(BaseModel):
+    posts: list[SPostRandom]
+    next_cursor: Optional[str] = None
+
+
 class SPostProfile(SHashtagPosts):
     pass
 
 
+class SPostDetail(SPostProfile):
+    hashtags: list[SHashtag]
+    image: Optional[SPostImageInfo]
+    user: Optional[SUserLiked]
+
+
+class SPostBatchInfo(SPostDetail):
+    pass
+
+
+class SPostBatch(BaseModel):
+    posts: list[SPostBatchInfo]
+    missing_ids: list[int]
+
+
 class SPostInfo(SPostProfile):
     hashtags: list[SHashtag]
     image: Optional[SPostImageInfo]
@@ -1,19 +1,34 @@
 import re
+from datetime import datetime
 from typing import Optional, Union
 
 from app.activity.models import Activity
+from app.config import settings
+from app.counters import TouchedCounters, TOUCHED_POSTS_KEY
 from app.database import async_session_maker
-from app.exceptions import CannotAddDataToDatabase, HashtagNotFound, PostNotFound, UserNotFound
-from app.image_utils import image_add_origin
+from app.exceptions import (
+    CannotAddDataToDatabase, HashtagNotFound, PostNotFound, IncorrectCursorException, IncorrectPostIdsException
+)
+from app.image_utils import image_encode_upload, image_relative_path, image_store
+from app.pagination import encode_cursor, decode_cursor, decode_id_cursor
 from app.post.models import Post
 from app.post.schemas import (
     SPostCreate, SPostImageInfo, SPostInfo, SHashtagPosts, SPostRandom,
-    SPostRandomWithPostAssociation
+    SPostRandomWithPostAssociation, SPostFeedPage, STrendingHashtag, SPostLikeInfo, SPostLikersPage,
+    SPostLikesSummary, SPostBatch, SPostBatchInfo, SPostDetail
 )
-from app.post.dao import PostDAO, PostImageDAO, HashtagDAO
+from app.post.cache import post_cache
+from app.post.dao import PostDAO, PostImageDAO, HashtagDAO, ImageFileDAO
+from app.post.hashtag_index import HashtagIndex
+from app.post.like_counter import LikeCounter
+from app.post.timeline import TimelineCache
+from app.post.trending import TrendingHashtags
+from app.profile.dao import ProfileFollowDAO
+from app.tasks.tasks import generate_image_variants
 from app.logger import logger
 from fastapi import UploadFile, File
-from sqlalchemy.exc import SQLAlchemyError
+from redis.exceptions import RedisError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.user.dao import UserDAO
@@ -40,6 +55,9 @@ class PostService:
 
         new_post.hashtags = existing_hashtags
 
+        if existing_hashtags:
+            await HashtagDAO.db_increment_posts_count(session, [hashtag.id for hashtag in existing_hashtags])
+
     @classmethod
     async def service_upload_photo_for_post(
             cls, user_id: int, image: UploadFile = File(...)
@@ -47,9 +65,8 @@ class PostService:
         """
         Загружаем фото для поста.
         """
-        path_folder = f"app/static/post_images/post_{user_id}"
-        path_file = await image_add_origin(path_folder, image)
-        relative_path = f"/post_images/post_{user_id}/{path_file}"
+        encoded = await image_encode_upload(image)
+        relative_path = image_relative_path("/post_images", encoded.content_hash)
 
         async with async_session_maker() as session:
             new_photo = await PostImageDAO.add(
@@ -57,10 +74,54 @@ class PostService:
                 image=relative_path,
                 user_id=user_id
             )
+            await ImageFileDAO.db_acquire(session, relative_path, encoded.content_hash, len(encoded.data))
             await session.commit()
 
+        await image_store(relative_path, encoded.data)
+
+        generate_image_variants.delay("post", new_photo.id, relative_path)
+
         return new_photo
 
+    @classmethod
+    async def service_fan_out_post(cls, new_post: Post):
+        """
+        Раскладываем id нового поста по домашним лентам подписчиков (fan-out-on-write).
+        Авторов с большим числом подписчиков читатели подтягивают сами при чтении ленты.
+        Пост уже сохранен, поэтому ошибки здесь только логируем.
+        """
+        try:
+            user_ids = [new_post.user_id]
+
+            async with async_session_maker() as session:
+                author = await UserDAO.find_one_or_none(session, id=new_post.user_id)
+
+                if author and author.followers_count <= settings.TIMELINE_FANOUT_MAX_FOLLOWERS:
+                    user_ids += await ProfileFollowDAO.db_get_follower_ids(session, new_post.user_id)
+
+            await TimelineCache.push_post(new_post.id, user_ids)
+        except Exception:
+            logger.error("Cannot fan out post to timelines", exc_info=True)
+
+    @classmethod
+    async def service_record_trending(cls, new_post: Post):
+        """
+        Учитываем хэштеги нового поста в скользящих окнах популярности
+        """
+        try:
+            await TrendingHashtags.record([hashtag.name for hashtag in new_post.hashtags])
+        except Exception:
+            logger.error("Cannot record trending hashtags", exc_info=True)
+
+    @classmethod
+    async def service_get_trending_hashtags(cls, window: str = "day", limit: int = 10) -> list[STrendingHashtag]:
+        """
+        Популярные хэштеги за последний час/день/неделю
+        """
+        top = await TrendingHashtags.top(window, limit)
+
+        return [STrendingHashtag(name=name, count=int(count)) for name, count in top]
+
     @classmethod
     async def service_create_post(cls, user_id: int, post: SPostCreate):
         """
@@ -88,8 +149,6 @@ class PostService:
                 session.add(new_post)
 
                 await session.commit()
-
-            return new_post
         except (SQLAlchemyError, Exception) as e:
             msg = ""
             if isinstance(e, SQLAlchemyError):
@@ -103,26 +162,68 @@ class PostService:
 
             raise CannotAddDataToDatabase
 
+        await cls.service_fan_out_post(new_post)
+        await cls.service_record_trending(new_post)
+
+        return new_post
+
     @classmethod
     async def service_get_user_posts(cls, user_id: int) -> list[SPostInfo]:
         """
         Получаем список всех постов пользователя
         """
         async with async_session_maker() as session:
-            return await PostDAO.db_get_user_posts(session, user_id)
+            posts = await PostDAO.db_get_user_posts(session, user_id)
+
+        return await cls.service_merge_pending_likes(posts)
 
     @classmethod
-    async def service_get_posts_from_hashtag(cls, hashtag_name: str) -> list[SHashtagPosts]:
+    async def service_get_posts_from_hashtag(cls, hashtag_name: str, limit: int = 100) -> list[SHashtagPosts]:
         """
         Получаем посты из хэштегов
         """
         async with async_session_maker() as session:
-            hashtag = await HashtagDAO.db_get_posts_from_hashtag(session, hashtag_name)
+            hashtags = await HashtagDAO.db_one_hashtag_in(session, [hashtag_name])
 
-        if not hashtag:
-            raise HashtagNotFound
+            if not hashtags:
+                raise HashtagNotFound
+
+            post_ids = await HashtagIndex.get_page_any(session, hashtags, None, limit)
+            posts = await PostDAO.db_get_posts_join_user_by_ids(session, post_ids)
+
+        return await cls.service_merge_pending_likes([SHashtagPosts(**post) for post in posts])
+
+    @classmethod
+    async def service_get_posts_by_hashtags(
+            cls, tags: str, mode: str = "and", cursor: Optional[str] = None, limit: int = 10
+    ) -> SPostFeedPage:
+        """
+        Посты по нескольким хэштегам (?tags=a,b): пересечение (and) или объединение (or) posting-листов
+        """
+        names = list({name.strip().lstrip("#") for name in tags.split(",") if name.strip().lstrip("#")})
+        max_id = decode_id_cursor(cursor)
 
-        return hashtag.posts
+        async with async_session_maker() as session:
+            hashtags = await HashtagDAO.db_one_hashtag_in(session, names)
+
+            if not hashtags:
+                raise HashtagNotFound
+
+            if mode == "and":
+                if len({hashtag.name for hashtag in hashtags}) < len(names):
+                    return SPostFeedPage(posts=[])
+
+                post_ids = await HashtagIndex.get_page_all(session, hashtags, max_id, limit)
+            else:
+                post_ids = await HashtagIndex.get_page_any(session, hashtags, max_id, limit)
+
+            posts = await PostDAO.db_get_posts_join_user_by_ids(session, post_ids)
+
+        next_cursor = encode_cursor(post_ids[-1]) if len(post_ids) == limit else None
+
+        posts = await cls.service_merge_pending_likes([SPostRandom(**post) for post in posts])
+
+        return SPostFeedPage(posts=posts, next_cursor=next_cursor)
 
     @classmethod
     async def service_get_random_posts_for_feed(
@@ -131,28 +232,142 @@ class PostService:
         """
         Получаем случайные посты для пользователей в ленте. Возвращаем последние посты для всех пользователей
         """
+        offset = (page - 1) * limit
+
         async with async_session_maker() as session:
-            total_posts = await PostDAO.db_total_posts(session)
+            posts = await PostDAO.db_get_posts_join_user(session, offset, limit, hashtag)
 
-            offset = (page - 1) * limit
+        if not hashtag:
+            return await cls.service_merge_pending_likes([SPostRandom(**post) for post in posts])
 
-            if offset >= total_posts:
-                return []
+        return await cls.service_merge_pending_likes([SPostRandomWithPostAssociation(**post) for post in posts])
 
-            posts = await PostDAO.db_get_posts_join_user(session, offset, limit, hashtag)
+    @classmethod
+    async def service_get_posts_for_feed_by_cursor(
+            cls, cursor: Optional[str] = None, limit: int = 10, hashtag: str = None
+    ) -> SPostFeedPage:
+        """
+        Лента по курсору (created_at, id): без count(*) и OFFSET, следующая страница ищется по индексу
+        """
+        created_at, post_id = None, None
 
-        if not hashtag:
-            return [SPostRandom(**post) for post in posts]
+        if cursor:
+            raw_created_at, post_id = decode_cursor(cursor, 2)
+
+            try:
+                created_at = datetime.fromisoformat(raw_created_at)
+                post_id = int(post_id)
+            except (TypeError, ValueError):
+                raise IncorrectCursorException
+
+        async with async_session_maker() as session:
+            posts = await PostDAO.db_get_posts_join_user_by_cursor(
+                session, limit + 1, created_at, post_id, hashtag
+            )
+
+        next_cursor = None
+
+        if len(posts) > limit:
+            posts = posts[:limit]
+            last = posts[-1]
+            next_cursor = encode_cursor(last["created_at"].isoformat(), last["id"])
+
+        posts = await cls.service_merge_pending_likes([SPostRandom(**post) for post in posts])
+
+        return SPostFeedPage(posts=posts, next_cursor=next_cursor)
+
+    @classmethod
+    async def service_get_home_timeline(
+            cls, user_id: int, cursor: Optional[str] = None, limit: int = 10
+    ) -> SPostFeedPage:
+        """
+        Домашняя лента: одно чтение диапазона из Redis и один запрос гидратации постов.
+        Холодная лента собирается из подписок и сохраняется в Redis.
+        """
+        max_id = decode_id_cursor(cursor)
+
+        try:
+            post_ids = await TimelineCache.get_page(user_id, max_id, limit)
+        except RedisError:
+            logger.error("Redis Exc: Cannot read timeline", exc_info=True)
+            post_ids = None
+
+        async with async_session_maker() as session:
+            if post_ids is None:
+                timeline_ids = await PostDAO.db_get_timeline_post_ids(session, user_id, settings.TIMELINE_MAX_SIZE)
+
+                try:
+                    await TimelineCache.fill(user_id, timeline_ids)
+                except RedisError:
+                    logger.error("Redis Exc: Cannot fill timeline", exc_info=True)
+
+                post_ids = [post_id for post_id in timeline_ids if not max_id or post_id < max_id][:limit]
 
-        return [SPostRandomWithPostAssociation(**post) for post in posts]
+            posts = await PostDAO.db_get_timeline_posts(
+                session, user_id, post_ids, max_id, limit, settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+            )
+
+        next_cursor = None
+
+        if len(posts) == limit:
+            next_cursor = encode_cursor(posts[-1]["id"])
+        elif len(post_ids) == limit:
+            # Часть id из ленты указывает на удаленные посты - продолжаем с конца прочитанного диапазона
+            next_cursor = encode_cursor(min(post_ids + [post["id"] for post in posts]))
+
+        posts = await cls.service_merge_pending_likes([SPostRandom(**post) for post in posts])
+
+        return SPostFeedPage(posts=posts, next_cursor=next_cursor)
+
+    @classmethod
+    async def service_get_post_by_id(cls, post_id: int) -> Optional[SPostDetail]:
+        """
+        Получаем пост по id через кэш (LRU процесса -> Redis -> БД).
+        Лайкнувших в кэше нет - они отдаются постранично, счетчик дополняется дельтами write-behind
+        """
+        cached_post = await post_cache.get(post_id)
+
+        if cached_post:
+            post = SPostDetail.model_validate_json(cached_post)
+        else:
+            version = await post_cache.version(post_id)
+
+            async with async_session_maker() as session:
+                db_post = await PostDAO.db_get_post_by_id(session, post_id)
+
+            if not db_post:
+                return None
+
+            post = SPostDetail.model_validate(db_post)
+            await post_cache.set(post_id, post.model_dump_json(), version)
+
+        await cls.service_merge_pending_likes([post])
+
+        return post
 
     @classmethod
-    async def service_get_post_by_id(cls, post_id: int) -> Optional[SPostInfo]:
+    async def service_get_posts_batch(cls, ids: str) -> SPostBatch:
         """
-        Получаем пост по id
+        Получаем несколько постов за фиксированное число запросов, в порядке переданных id
         """
+        try:
+            post_ids = list(dict.fromkeys(int(post_id) for post_id in ids.split(",") if post_id.strip()))
+        except ValueError:
+            raise IncorrectPostIdsException
+
+        if not post_ids or len(post_ids) > settings.POSTS_BATCH_MAX_SIZE:
+            raise IncorrectPostIdsException
+
         async with async_session_maker() as session:
-            return await PostDAO.db_get_post_by_id(session, post_id)
+            db_posts = await PostDAO.db_get_posts_by_ids(session, post_ids)
+
+        posts_by_id = {post.id: SPostBatchInfo.model_validate(post) for post in db_posts}
+        posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+
+        return SPostBatch(
+            posts=await cls.service_merge_pending_likes(posts),
+            missing_ids=[post_id for post_id in post_ids if post_id not in posts_by_id]
+        )
 
     @classmethod
     async def service_delete_post_by_id(cls, post_id: int, user_id: int):
@@ -162,72 +377,159 @@ class PostService:
         async with async_session_maker() as session:
             post = await PostDAO.find_one_or_none(session, id=post_id)
 
-            if post:
+            if post and post.user_id == user_id:
+                await HashtagDAO.db_decrement_posts_count(session, post_id)
                 await PostDAO.delete(session, id=post_id, user_id=user_id)
 
             await session.commit()
 
+        await post_cache.delete(post_id)
+
     @classmethod
-    async def service_get_post_and_user(cls, session: AsyncSession, post_id: int, username: str):
-        post = await PostDAO.db_get_post_by_id(session, post_id)
+    async def service_merge_pending_likes(cls, posts: list):
+        """
+        В режиме write-behind добавляем к likes_count еще не перенесенные в БД дельты
+        """
+        if not (settings.LIKES_WRITE_BEHIND and posts):
+            return posts
 
-        if not post:
-            raise PostNotFound
+        try:
+            pending = await LikeCounter.pending([post.id for post in posts])
+        except RedisError:
+            logger.error("Redis Exc: Cannot read pending likes", exc_info=True)
+            return posts
 
-        user = await UserDAO.find_one_or_none(session, first_name=username)
+        for post in posts:
+            post.likes_count += pending.get(post.id, 0)
 
-        if not user:
-            raise UserNotFound
+        return posts
 
-        return post, user
+    @classmethod
+    async def service_add_pending_like(cls, post: dict, delta: int) -> SPostLikeInfo:
+        """
+        Write-behind: дельта уходит в Redis, строку post не блокируем
+        """
+        likes_count = post["likes_count"]
+
+        try:
+            likes_count += await LikeCounter.add(post["id"], delta)
+        except RedisError:
+            logger.error("Redis Exc: Cannot add pending like", exc_info=True)
+
+        return SPostLikeInfo(id=post["id"], likes_count=likes_count)
 
     @classmethod
-    async def service_like_post(cls, post_id: int, username: str):
+    async def service_like_post(cls, post_id: int, user_id: int, username: str):
+        """
+        Лайк одним запросом: вставка в post_likes_association и likes_count + 1
+        """
+        write_behind = settings.LIKES_WRITE_BEHIND
+
         async with async_session_maker() as session:
-            post, user = await cls.service_get_post_and_user(session, post_id, username)
+            try:
+                liked_post = await PostDAO.db_like_post(session, post_id, user_id, update_count=not write_behind)
+            except IntegrityError:
+                raise PostNotFound
 
-            if user in post.liked_by_users:
+            if not liked_post:
                 return False, "Пост уже понравился"
 
-            post.liked_by_users.append(user)
-            post.likes_count = len(post.liked_by_users)
-
-            # TO DO activity of like
-
             activity = Activity(
-                username=post.user.first_name,
+                username=liked_post["first_name"],
                 liked_post_id=post_id,
                 username_like=username,
-                liked_post_image_id=post.image_id
+                liked_post_image_id=liked_post["image_id"]
             )
 
             session.add(activity)
 
             await session.commit()
 
-        return post
+        if not write_behind:
+            # Без write-behind счетчик в кэше не дополняется дельтами, поэтому запись сбрасываем
+            await post_cache.delete(post_id)
+
+        await TouchedCounters.mark(TOUCHED_POSTS_KEY, post_id)
+
+        if write_behind:
+            return await cls.service_add_pending_like(liked_post, 1)
+
+        return SPostLikeInfo(**liked_post)
 
     @classmethod
-    async def service_unlike_post(cls, post_id: int, username: str):
+    async def service_unlike_post(cls, post_id: int, user_id: int):
+        """
+        Снятие лайка одним запросом: удаление из post_likes_association и likes_count - 1
+        """
+        write_behind = settings.LIKES_WRITE_BEHIND
+
         async with async_session_maker() as session:
-            post, user = await cls.service_get_post_and_user(session, post_id, username)
+            unliked_post = await PostDAO.db_unlike_post(session, post_id, user_id, update_count=not write_behind)
 
-            if user not in post.liked_by_users:
+            if not unliked_post:
                 return False, "Пост еще не лайкали"
 
-            post.liked_by_users.remove(user)
-            post.likes_count = len(post.liked_by_users)
-
             await session.commit()
 
-        return post
+        if not write_behind:
+            # Без write-behind счетчик в кэше не дополняется дельтами, поэтому запись сбрасываем
+            await post_cache.delete(post_id)
+
+        await TouchedCounters.mark(TOUCHED_POSTS_KEY, post_id)
+
+        if write_behind:
+            return await cls.service_add_pending_like(unliked_post, -1)
+
+        return SPostLikeInfo(**unliked_post)
+
+    @classmethod
+    async def service_liked_users_post(cls, post_id: int, limit: int = 100) -> list[SUserLiked]:
+        page = await cls.service_get_post_likers(post_id, None, limit)
+
+        return page.users
 
     @classmethod
-    async def service_liked_users_post(cls, post_id: int) -> list[SUserLiked]:
+    async def service_get_post_likers(
+            cls, post_id: int, cursor: Optional[str] = None, limit: int = 20
+    ) -> SPostLikersPage:
+        """
+        Лайкнувшие пост пользователи постранично, курсор - id последнего пользователя
+        """
+        max_user_id = decode_id_cursor(cursor)
+
         async with async_session_maker() as session:
-            post = await PostDAO.db_get_post_by_id(session, post_id)
+            likers = await PostDAO.db_get_likers(session, post_id, max_user_id, limit)
 
-            if not post:
+            if not (likers or cursor) and await PostDAO.db_get_likes_count(session, post_id) is None:
                 raise PostNotFound
 
-        return post.liked_by_users
+        next_cursor = encode_cursor(likers[-1]["id"]) if len(likers) == limit else None
+
+        return SPostLikersPage(users=[SUserLiked(**user) for user in likers], next_cursor=next_cursor)
+
+    @classmethod
+    async def service_get_likes_summary(cls, post_id: int, size: int = 2) -> SPostLikesSummary:
+        """
+        Краткая сводка для карточки поста: "понравилось X, Y и еще N"
+        """
+        async with async_session_maker() as session:
+            likes_count = await PostDAO.db_get_likes_count(session, post_id)
+
+            if likes_count is None:
+                raise PostNotFound
+
+            likers = await PostDAO.db_get_likers(session, post_id, None, size)
+
+        if settings.LIKES_WRITE_BEHIND:
+            try:
+                likes_count += (await LikeCounter.pending([post_id])).get(post_id, 0)
+            except RedisError:
+                logger.error("Redis Exc: Cannot read pending likes", exc_info=True)
+
+        users = [SUserLiked(**user) for user in likers]
+
+        return SPostLikesSummary(
+            likes_count=likes_count,
+            users=users,
+            others_count=max(likes_count - len(users), 0)
+        )
@@ -0,0 +1,79 @@
+from typing import Optional
+
+from app.config import settings
+from app.redis_client import redis_client
+
+
+# Добавляем пост только в уже прогретые ленты: холодная лента будет собрана целиком при чтении
+PUSH_TO_EXISTING_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('ZADD', key, ARGV[1], ARGV[1])
+        redis.call('ZREMRANGEBYRANK', key, 0, -tonumber(ARGV[2]) - 1)
+        redis.call('EXPIRE', key, ARGV[3])
+    end
+end
+return 1
+"""
+
+push_to_existing = redis_client.register_script(PUSH_TO_EXISTING_SCRIPT)
+
+FANOUT_BATCH_SIZE = 1000
+
+
+# Маркер прогретой ленты: пустая лента тоже хранится в Redis и не уходит каждый раз в БД
+EMPTY_MARKER = 0
+
+
+class TimelineCache:
+    """
+    Домашние ленты в Redis: ZSET timeline:{user_id}, где и член, и score - id поста
+    """
+
+    @classmethod
+    def key(cls, user_id: int) -> str:
+        return f"timeline:{user_id}"
+
+    @classmethod
+    def ttl(cls) -> int:
+        return settings.TIMELINE_TTL_DAYS * 24 * 60 * 60
+
+    @classmethod
+    async def push_post(cls, post_id: int, user_ids: list[int]):
+        for start in range(0, len(user_ids), FANOUT_BATCH_SIZE):
+            await push_to_existing(
+                keys=[cls.key(user_id) for user_id in user_ids[start:start + FANOUT_BATCH_SIZE]],
+                args=[post_id, settings.TIMELINE_MAX_SIZE, cls.ttl()]
+            )
+
+    @classmethod
+    async def get_page(cls, user_id: int, max_id: Optional[int], limit: int) -> Optional[list[int]]:
+        """
+        Одно чтение диапазона. None - лента холодная и ее нужно собрать из БД
+        """
+        key = cls.key(user_id)
+        upper = f"({max_id}" if max_id else "+inf"
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.exists(key)
+            pipe.zrevrangebyscore(key, upper, f"({EMPTY_MARKER}", start=0, num=limit)
+            exists, post_ids = await pipe.execute()
+
+        if not exists:
+            return None
+
+        return [int(post_id) for post_id in post_ids]
+
+    @classmethod
+    async def fill(cls, user_id: int, post_ids: list[int]):
+        key = cls.key(user_id)
+
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.zadd(key, {EMPTY_MARKER: EMPTY_MARKER, **{post_id: post_id for post_id in post_ids}})
+            pipe.expire(key, cls.ttl())
+            await pipe.execute()
+
+    @classmethod
+    async def invalidate(cls, user_id: int):
+        await redis_client.delete(cls.key(user_id))
@@ -0,0 +1,78 @@
+import time
+from typing import Optional
+
+import redis
+
+from app.config import settings
+from app.redis_client import redis_client
+
+
+# Окно: (длина корзины в секундах, количество корзин)
+WINDOWS = {
+    "hour": (60, 60),
+    "day": (60 * 60, 24),
+    "week": (6 * 60 * 60, 28),
+}
+
+
+class TrendingHashtags:
+    """
+    Скользящие окна популярности хэштегов в Redis.
+    Каждое использование попадает в корзину окна и в итоговый ZSET окна trending:{window},
+    который раз в минуту пересобирается из живых корзин. Чтение топа - один ZREVRANGE.
+    """
+
+    @classmethod
+    def window_key(cls, window: str) -> str:
+        return f"trending:{window}"
+
+    @classmethod
+    def bucket_key(cls, window: str, index: int) -> str:
+        return f"trending:{window}:{index}"
+
+    @classmethod
+    async def record(cls, names: list[str], now: Optional[float] = None):
+        if not names:
+            return
+
+        now = now or time.time()
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for window, (bucket_seconds, buckets) in WINDOWS.items():
+                bucket_key = cls.bucket_key(window, int(now // bucket_seconds))
+
+                for name in names:
+                    pipe.zincrby(bucket_key, 1, name)
+                    pipe.zincrby(cls.window_key(window), 1, name)
+
+                pipe.expire(bucket_key, bucket_seconds * (buckets + 1))
+
+            await pipe.execute()
+
+    @classmethod
+    async def top(cls, window: str, limit: int = 10) -> list[tuple[str, float]]:
+        if limit < 1:
+            # ZREVRANGE 0 -1 вернул бы весь ZSET
+            return []
+
+        return await redis_client.zrevrange(cls.window_key(window), 0, limit - 1, withscores=True)
+
+    @classmethod
+    def rebuild_windows(cls, client: redis.Redis, now: Optional[float] = None):
+        """
+        Пересобираем окна из живых корзин: выпавшие корзины перестают учитываться,
+        закрытые корзины и сами окна обрезаются до TRENDING_MAX_TAGS самых частых хэштегов
+        """
+        now = now or time.time()
+
+        for window, (bucket_seconds, buckets) in WINDOWS.items():
+            current = int(now // bucket_seconds)
+            live_keys = [cls.bucket_key(window, index) for index in range(current - buckets + 1, current + 1)]
+
+            with client.pipeline(transaction=True) as pipe:
+                for key in live_keys[:-1]:
+                    pipe.zremrangebyrank(key, 0, -settings.TRENDING_MAX_TAGS - 1)
+
+                pipe.zunionstore(cls.window_key(window), live_keys)
+                pipe.zremrangebyrank(cls.window_key(window), 0, -settings.TRENDING_MAX_TAGS - 1)
+                pipe.execute()
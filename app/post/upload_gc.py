@@ -0,0 +1,219 @@
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.config import settings
+from app.metrics import metrics
+from app.post.dao import PostImageDAO, ImageFileDAO
+
+STATIC_ROOT = "app/static"
+UPLOAD_FOLDERS = ("/post_images", "/user_images")
+
+
+def original_path(relative_path: str) -> str:
+    """ Путь оригинала для файла варианта: .../{stem}_thumbnail.webp -> .../{stem}.webp
+    """
+    names = "|".join(map(re.escape, settings.IMAGE_VARIANTS))
+    match = re.fullmatch(rf"(.+)_(?:{names})\.webp", relative_path)
+
+    return f"{match.group(1)}.webp" if match else relative_path
+
+
+def file_size(relative_path: str) -> int:
+    try:
+        return os.path.getsize(f"{STATIC_ROOT}{relative_path}")
+    except FileNotFoundError:
+        return 0
+
+
+class UploadCollector:
+    """
+    Сборщик мусора загрузок:
+    1. PostImage, на которые за UPLOAD_GC_GRACE_SECONDS так и не сослался пост (или пост удален)
+    2. ref_count файлов пересчитывается по реальным ссылкам
+    3. файлы без ссылок удаляются вместе с вариантами
+    4. файлы на диске, о которых БД не знает
+    В режиме dry_run ничего не удаляется, только считается, сколько байт освободилось бы
+    """
+
+    def __init__(self, session_maker: async_sessionmaker, dry_run: bool):
+        self.session_maker = session_maker
+        self.dry_run = dry_run
+        self.batch_size = settings.UPLOAD_GC_BATCH_SIZE
+        self.older_than = datetime.now(timezone.utc) - timedelta(seconds=settings.UPLOAD_GC_GRACE_SECONDS)
+        self.report = {
+            "dry_run": dry_run,
+            "post_images": 0,
+            "ref_counts_corrected": 0,
+            "files": 0,
+            "untracked_files": 0,
+            "bytes": 0,
+        }
+
+    def remove_file(self, relative_path: str, with_variants: bool = True) -> int:
+        paths = [relative_path]
+
+        if with_variants:
+            stem = relative_path.removesuffix(".webp")
+            paths += [f"{stem}_{name}.webp" for name in settings.IMAGE_VARIANTS]
+
+        removed = 0
+
+        for path in paths:
+            size = file_size(path)
+
+            if not self.dry_run and size:
+                try:
+                    os.unlink(f"{STATIC_ROOT}{path}")
+                except FileNotFoundError:
+                    continue
+
+            removed += size
+
+        return removed
+
+    async def collect_post_images(self):
+        if self.dry_run:
+            after_id = 0
+
+            async with self.session_maker() as session:
+                while orphans := await PostImageDAO.db_get_orphans(session, self.older_than, after_id, self.batch_size):
+                    self.report["post_images"] += len(orphans)
+                    # Верхняя оценка: файл, общий с другими картинками, останется
+                    self.report["bytes"] += sum(orphan.size or 0 for orphan in orphans)
+                    after_id = orphans[-1].id
+
+            return
+
+        while True:
+            with metrics.timer("upload_gc.batch"):
+                async with self.session_maker() as session:
+                    images = await PostImageDAO.db_delete_orphans(session, self.older_than, self.batch_size)
+                    await ImageFileDAO.db_release_many(session, [image for image in images if image])
+                    await session.commit()
+
+            self.report["post_images"] += len(images)
+
+            if len(images) < self.batch_size:
+                break
+
+    async def reconcile_ref_counts(self):
+        if self.dry_run:
+            return
+
+        after_path: Optional[str] = None
+
+        while True:
+            async with self.session_maker() as session:
+                after_path, corrected = await ImageFileDAO.db_reconcile_ref_counts(session, after_path, self.batch_size)
+                await session.commit()
+
+            self.report["ref_counts_corrected"] += corrected
+
+            if after_path is None:
+                break
+
+    async def collect_files(self):
+        if self.dry_run:
+            after_path = None
+
+            async with self.session_maker() as session:
+                while files := await ImageFileDAO.db_get_unreferenced(
+                        session, self.older_than, after_path, self.batch_size
+                ):
+                    self.report["files"] += len(files)
+                    self.report["bytes"] += sum(self.remove_file(file.path) for file in files)
+                    after_path = files[-1].path
+
+            return
+
+        while True:
+            with metrics.timer("upload_gc.batch"):
+                async with self.session_maker() as session:
+                    paths = await ImageFileDAO.db_delete_unreferenced(session, self.older_than, self.batch_size)
+
+                    # Файлы удаляем до коммита, пока строки еще заблокированы
+                    self.report["bytes"] += sum(self.remove_file(path) for path in paths)
+                    await session.commit()
+
+            self.report["files"] += len(paths)
+
+            if len(paths) < self.batch_size:
+                break
+
+    def walk_uploads(self):
+        """ Файлы старше grace-периода: (путь от static, размер)
+        """
+        deadline = time.time() - settings.UPLOAD_GC_GRACE_SECONDS
+
+        for folder in UPLOAD_FOLDERS:
+            for root, _, filenames in os.walk(f"{STATIC_ROOT}{folder}"):
+                for filename in filenames:
+                    full_path = os.path.join(root, filename)
+
+                    try:
+                        stat_result = os.stat(full_path)
+                    except FileNotFoundError:
+                        continue
+
+                    if stat_result.st_mtime < deadline:
+                        yield full_path.removeprefix(STATIC_ROOT), stat_result.st_size
+
+    async def collect_untracked_files(self):
+        batch = []
+
+        for item in self.walk_uploads():
+            batch.append(item)
+
+            if len(batch) >= self.batch_size:
+                await self.collect_untracked_batch(batch)
+                batch = []
+
+        if batch:
+            await self.collect_untracked_batch(batch)
+
+    async def collect_untracked_batch(self, batch: list[tuple[str, int]]):
+        # Недописанные временные файлы от упавших загрузок
+        for path, _ in batch:
+            if path.endswith(".tmp"):
+                self.report["untracked_files"] += 1
+                self.report["bytes"] += self.remove_file(path, with_variants=False)
+
+        candidates = [path for path, _ in batch if not path.endswith(".tmp")]
+
+        async with self.session_maker() as session:
+            referenced = await ImageFileDAO.db_get_referenced_paths(
+                session, list({original_path(path) for path in candidates})
+            )
+            untracked = [path for path in candidates if original_path(path) not in referenced]
+
+            if self.dry_run or not untracked:
+                self.report["untracked_files"] += len(untracked)
+                self.report["bytes"] += sum(self.remove_file(path, with_variants=False) for path in untracked)
+                return
+
+            # Перепроверяем под блокировкой путей: загрузка того же содержимого могла успеть сослаться на файл
+            originals = list({original_path(path) for path in untracked})
+            await ImageFileDAO.db_lock_paths(session, originals)
+            referenced = await ImageFileDAO.db_get_referenced_paths(session, originals)
+
+            for path in untracked:
+                if original_path(path) not in referenced:
+                    self.report["untracked_files"] += 1
+                    self.report["bytes"] += self.remove_file(path, with_variants=False)
+
+            # Блокировки снимаются только после удаления файлов
+            await session.commit()
+
+    async def run(self) -> dict:
+        with metrics.timer("upload_gc.run"):
+            await self.collect_post_images()
+            await self.reconcile_ref_counts()
+            await self.collect_files()
+            await self.collect_untracked_files()
+
+        return self.report
@@ -0,0 +1,11 @@
+from app.cache import RedisLRUCache
+from app.config import settings
+
+
+# Сериализованный SProfileCard по имени пользователя
+profile_card_cache = RedisLRUCache(
+    "profile_card",
+    ttl=settings.PROFILE_CARD_CACHE_TTL_SECONDS,
+    local_ttl=settings.PROFILE_CARD_CACHE_LOCAL_TTL_SECONDS,
+    max_size=settings.PROFILE_CARD_CACHE_MAX_SIZE
+)
@@ -1,48 +1,212 @@
+from typing import Optional
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.dao.base import BaseDAO
 
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy import select, update, delete, or_, and_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.user.models import Follow, User
 
 
+# Для списков пользователей хватает миниатюры, пока ее нет - оригинал
+image_thumbnail = func.coalesce(User.image_variants["thumbnail"].astext, User.image).label("image_thumbnail")
+
+
 class ProfileUserDAO(BaseDAO):
     model = User
 
     @classmethod
-    async def db_get_profile(cls, session: AsyncSession, **filter_by):
+    async def db_get_user_id(cls, session: AsyncSession, username: str) -> Optional[int]:
+        query = select(cls.model.id).filter_by(first_name=username).limit(1)
+        result = await session.execute(query)
+        return result.scalar_one_or_none()
+
+    @classmethod
+    async def db_get_users_projection(cls, session: AsyncSession, user_ids: list[int]):
+        """
+        id, first_name и image пользователей в порядке переданных id
+        """
         query = (
-            select(cls.model)
-            .options(selectinload(cls.model.posts))
-            .options(selectinload(cls.model.followers))
-            .options(selectinload(cls.model.following))
-            .filter_by(**filter_by)
+            select(cls.model.id, cls.model.first_name, cls.model.image, image_thumbnail)
+            .where(cls.model.id.in_(user_ids))
         )
         result = await session.execute(query)
-        return result.scalars().one_or_none()
+        users = {user["id"]: user for user in result.mappings().all()}
+
+        return [users[user_id] for user_id in user_ids if user_id in users]
 
 
 class ProfileFollowDAO(BaseDAO):
     model = Follow
 
     @classmethod
-    async def db_get_followers_with_user(cls, session: AsyncSession, user_id: int):
+    async def db_get_relationships(cls, session: AsyncSession, user_id: int, user_ids: list[int]):
+        """
+        Связи пользователя с переданными id одним запросом по первичному ключу и индексу (following_id, follower_id)
+        """
         query = (
-            select(cls.model)
-            .options(joinedload(cls.model.follower))
-            .filter_by(following_id=user_id)
+            select(cls.model.follower_id, cls.model.following_id)
+            .where(or_(
+                and_(cls.model.follower_id == user_id, cls.model.following_id.in_(user_ids)),
+                and_(cls.model.following_id == user_id, cls.model.follower_id.in_(user_ids))
+            ))
         )
         result = await session.execute(query)
+        return result.all()
+
+    @classmethod
+    async def db_get_following_ids(cls, session: AsyncSession, user_id: int) -> list[int]:
+        query = select(cls.model.following_id).filter_by(follower_id=user_id)
+        result = await session.execute(query)
         return result.scalars().all()
 
     @classmethod
-    async def db_get_following_with_user(cls, session: AsyncSession, user_id: int):
+    async def db_iter_all_edges(cls, session: AsyncSession, chunk_size: int):
+        """
+        Все ребра подписок порциями по chunk_size строк через серверный курсор
+        """
         query = (
-            select(cls.model)
-            .options(joinedload(cls.model.following))
-            .filter_by(follower_id=user_id)
+            select(cls.model.follower_id, cls.model.following_id)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await session.stream(query)
+
+        async for partition in result.partitions():
+            yield partition
+
+    @classmethod
+    async def db_follow(cls, session: AsyncSession, follower_id: int, following_id: int):
+        """
+        INSERT ... ON CONFLICT DO NOTHING и count + 1 у обоих пользователей одним запросом.
+        Возвращает first_name и image подписчика, пустой результат - подписка уже есть
+        """
+        inserted_follow = (
+            pg_insert(cls.model)
+            .values(follower_id=follower_id, following_id=following_id)
+            .on_conflict_do_nothing()
+            .returning(cls.model.follower_id, cls.model.following_id)
+            .cte("inserted_follow")
+        )
+        updated_following = (
+            update(User)
+            .where(User.id.in_(select(inserted_follow.c.following_id)))
+            .values(followers_count=User.followers_count + 1)
+            .returning(User.id)
+            .cte("updated_following")
+        )
+        query = (
+            update(User)
+            .where(User.id.in_(select(inserted_follow.c.follower_id)))
+            .values(following_count=User.following_count + 1)
+            .returning(User.id, User.first_name, User.image)
+            .add_cte(updated_following)
+        )
+        result = await session.execute(query)
+        return result.mappings().one_or_none()
+
+    @classmethod
+    async def db_unfollow(cls, session: AsyncSession, follower_id: int, following_id: int):
+        """
+        DELETE ... RETURNING и count - 1 у обоих пользователей одним запросом.
+        Пустой результат - подписки не было
+        """
+        deleted_follow = (
+            delete(cls.model)
+            .filter_by(follower_id=follower_id, following_id=following_id)
+            .returning(cls.model.follower_id, cls.model.following_id)
+            .cte("deleted_follow")
+        )
+        updated_following = (
+            update(User)
+            .where(User.id.in_(select(deleted_follow.c.following_id)))
+            .values(followers_count=User.followers_count - 1)
+            .returning(User.id)
+            .cte("updated_following")
+        )
+        query = (
+            update(User)
+            .where(User.id.in_(select(deleted_follow.c.follower_id)))
+            .values(following_count=User.following_count - 1)
+            .returning(User.id)
+            .add_cte(updated_following)
         )
+        result = await session.execute(query)
+        return result.mappings().one_or_none()
+
+    @classmethod
+    async def db_get_followers_projection(
+            cls, session: AsyncSession, user_id: int, max_follower_id: Optional[int], limit: int
+    ):
+        """
+        Страница подписчиков: только id, first_name и image, без ORM-объектов
+        """
+        query = (
+            select(User.id, User.first_name, User.image, image_thumbnail)
+            .join(cls.model, cls.model.follower_id == User.id)
+            .where(cls.model.following_id == user_id)
+        )
+
+        if max_follower_id:
+            query = query.where(cls.model.follower_id < max_follower_id)
+
+        query = query.order_by(cls.model.follower_id.desc()).limit(limit)
+
+        result = await session.execute(query)
+        return result.mappings().all()
+
+    @classmethod
+    async def db_get_followers_page(
+            cls, session: AsyncSession, user_id: int, max_follower_id: Optional[int], limit: int
+    ):
+        query = select(cls.model).filter_by(following_id=user_id)
+
+        if max_follower_id:
+            query = query.where(cls.model.follower_id < max_follower_id)
+
+        query = query.order_by(cls.model.follower_id.desc()).limit(limit)
+
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @classmethod
+    async def db_get_following_page(
+            cls, session: AsyncSession, user_id: int, max_following_id: Optional[int], limit: int
+    ):
+        query = select(cls.model).filter_by(follower_id=user_id)
+
+        if max_following_id:
+            query = query.where(cls.model.following_id < max_following_id)
+
+        query = query.order_by(cls.model.following_id.desc()).limit(limit)
+
         result = await session.execute(query)
         return result.scalars().all()
+
+    @classmethod
+    async def db_get_follower_ids(cls, session: AsyncSession, user_id: int) -> list[int]:
+        query = select(cls.model.follower_id).filter_by(following_id=user_id)
+        result = await session.execute(query)
+        return result.scalars().all()
+
+    @classmethod
+    async def db_get_following_projection(
+            cls, session: AsyncSession, user_id: int, max_following_id: Optional[int], limit: int
+    ):
+        """
+        Страница подписок: только id, first_name и image, без ORM-объектов
+        """
+        query = (
+            select(User.id, User.first_name, User.image, image_thumbnail)
+            .join(cls.model, cls.model.following_id == User.id)
+            .where(cls.model.follower_id == user_id)
+        )
+
+        if max_following_id:
+            query = query.where(cls.model.following_id < max_following_id)
+
+        query = query.order_by(cls.model.following_id.desc()).limit(limit)
+
+        result = await session.execute(query)
+        return result.mappings().all()
@@ -0,0 +1,221 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.database import async_session_maker
+from app.logger import logger
+from app.metrics import metrics
+from app.profile.dao import ProfileFollowDAO
+
+
+class CSRAdjacency:
+    """
+    Списки смежности в формате CSR: соседи вершины ids[i] - indices[indptr[i]:indptr[i + 1]]
+    """
+
+    def __init__(self, sources: np.ndarray, targets: np.ndarray):
+        # Сортируем по (source, target): внутри каждого списка соседи тоже отсортированы
+        order = np.lexsort((targets, sources))
+        sources, targets = sources[order], targets[order]
+
+        self.ids, counts = np.unique(sources, return_counts=True)
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+        self.indices = targets
+
+    def neighbors(self, user_id: int) -> np.ndarray:
+        position = np.searchsorted(self.ids, user_id)
+
+        if position >= len(self.ids) or self.ids[position] != user_id:
+            return np.empty(0, dtype=np.int64)
+
+        return self.indices[self.indptr[position]:self.indptr[position + 1]]
+
+
+class FollowGraph:
+    """
+    Граф подписок в памяти процесса: исходящие (following) и входящие (followers) ребра в CSR
+    плюс небольшой оверлей изменений, сделанных после последней пересборки
+    """
+
+    def __init__(self, follower_ids: np.ndarray, following_ids: np.ndarray):
+        self.following_csr = CSRAdjacency(follower_ids, following_ids)
+        self.followers_csr = CSRAdjacency(following_ids, follower_ids)
+        # Оверлей по вершинам: {user_id: {соседи}} отдельно для исходящих и входящих ребер
+        self.added_following = defaultdict(set)
+        self.added_followers = defaultdict(set)
+        self.removed_following = defaultdict(set)
+        self.removed_followers = defaultdict(set)
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_edges(cls, chunks: list[np.ndarray]) -> "FollowGraph":
+        """
+        Сборка из порций ребер (n, 2). Тяжелая часть - сортировка CSR, вызывается в отдельном потоке
+        """
+        edges = np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
+
+        return cls(edges[:, 0], edges[:, 1])
+
+    def add_edge(self, follower_id: int, following_id: int):
+        self.removed_following[follower_id].discard(following_id)
+        self.removed_followers[following_id].discard(follower_id)
+        self.added_following[follower_id].add(following_id)
+        self.added_followers[following_id].add(follower_id)
+
+    def remove_edge(self, follower_id: int, following_id: int):
+        self.added_following[follower_id].discard(following_id)
+        self.added_followers[following_id].discard(follower_id)
+        self.removed_following[follower_id].add(following_id)
+        self.removed_followers[following_id].add(follower_id)
+
+    @staticmethod
+    def _with_overlay(base: np.ndarray, added: Optional[set[int]], removed: Optional[set[int]]) -> np.ndarray:
+        if removed:
+            base = np.setdiff1d(base, list(removed))
+        if added:
+            base = np.union1d(base, list(added))
+
+        return base
+
+    def following(self, user_id: int) -> np.ndarray:
+        return self._with_overlay(
+            self.following_csr.neighbors(user_id),
+            self.added_following.get(user_id), self.removed_following.get(user_id)
+        )
+
+    def followers(self, user_id: int) -> np.ndarray:
+        return self._with_overlay(
+            self.followers_csr.neighbors(user_id),
+            self.added_followers.get(user_id), self.removed_followers.get(user_id)
+        )
+
+    def recommendations(self, user_id: int, limit: int) -> list[tuple[int, int]]:
+        """
+        Друзья друзей: на кого подписаны мои подписки, но не я, по убыванию числа общих связей
+        """
+        following = self.following(user_id)
+
+        if not len(following):
+            return []
+
+        candidates = np.concatenate([self.following(int(friend_id)) for friend_id in following])
+        candidates = candidates[~np.isin(candidates, following) & (candidates != user_id)]
+
+        if not len(candidates):
+            return []
+
+        user_ids, counts = np.unique(candidates, return_counts=True)
+        top = np.argsort(-counts, kind="stable")[:limit]
+
+        return [(int(user_ids[i]), int(counts[i])) for i in top]
+
+    def followed_by_following(self, user_id: int, target_id: int) -> np.ndarray:
+        """
+        Те, на кого я подписан и кто подписан на target
+        """
+        return np.intersect1d(self.following(user_id), self.followers(target_id), assume_unique=True)
+
+    def common_followers(self, user_id: int, target_id: int) -> np.ndarray:
+        return np.intersect1d(self.followers(user_id), self.followers(target_id), assume_unique=True)
+
+    def distance(self, user_id: int, target_id: int) -> Optional[int]:
+        """
+        Достижимость не дальше двух шагов по подпискам
+        """
+        if user_id == target_id:
+            return 0
+
+        if np.isin(target_id, self.following(user_id)):
+            return 1
+
+        if len(self.followed_by_following(user_id, target_id)):
+            return 2
+
+        return None
+
+
+class FollowGraphHolder:
+    """
+    Держит актуальный граф: первая сборка - при первом обращении,
+    дальше устаревший граф пересобирается в фоне, а запросы обслуживает текущий.
+    Подписки и отписки, пришедшие во время сборки, переносятся в оверлей нового графа
+    """
+
+    def __init__(self):
+        self.graph: Optional[FollowGraph] = None
+        self._lock = asyncio.Lock()
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._changes: Optional[list[tuple[int, int, bool]]] = None
+
+    async def load_edges(self) -> list[np.ndarray]:
+        chunks = []
+
+        async with async_session_maker() as session:
+            async for partition in ProfileFollowDAO.db_iter_all_edges(session, settings.FOLLOW_GRAPH_LOAD_CHUNK_SIZE):
+                chunks.append(await asyncio.to_thread(np.array, partition, dtype=np.int64))
+
+        return [chunk.reshape(-1, 2) for chunk in chunks]
+
+    async def build(self) -> FollowGraph:
+        # Изменения копим с начала чтения: повторное применение уже попавшего в снимок ребра безвредно
+        self._changes = []
+
+        try:
+            with metrics.timer("follow_graph.build"):
+                chunks = await self.load_edges()
+                graph = await asyncio.to_thread(FollowGraph.from_edges, chunks)
+
+            for follower_id, following_id, is_added in self._changes:
+                if is_added:
+                    graph.add_edge(follower_id, following_id)
+                else:
+                    graph.remove_edge(follower_id, following_id)
+
+            self.graph = graph
+        finally:
+            self._changes = None
+
+        metrics.incr("follow_graph.rebuilds")
+
+        return graph
+
+    async def _rebuild(self):
+        async with self._lock:
+            try:
+                await self.build()
+            except Exception:
+                logger.error("Unknown Exc: Cannot rebuild follow graph", exc_info=True)
+
+    async def get(self) -> FollowGraph:
+        if self.graph is None:
+            async with self._lock:
+                if self.graph is None:
+                    return await self.build()
+
+        is_stale = time.monotonic() - self.graph.built_at > settings.FOLLOW_GRAPH_REBUILD_SECONDS
+
+        if is_stale and (self._rebuild_task is None or self._rebuild_task.done()):
+            self._rebuild_task = asyncio.create_task(self._rebuild())
+
+        return self.graph
+
+    def add_edge(self, follower_id: int, following_id: int):
+        if self._changes is not None:
+            self._changes.append((follower_id, following_id, True))
+
+        if self.graph is not None:
+            self.graph.add_edge(follower_id, following_id)
+
+    def remove_edge(self, follower_id: int, following_id: int):
+        if self._changes is not None:
+            self._changes.append((follower_id, following_id, False))
+
+        if self.graph is not None:
+            self.graph.remove_edge(follower_id, following_id)
+
+
+follow_graph = FollowGraphHolder()
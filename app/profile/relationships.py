@@ -0,0 +1,81 @@
+from typing import Optional
+
+from app.config import settings
+from app.redis_client import redis_client
+
+
+# Служебный член множества: отличает загруженное пустое множество от отсутствующего ключа
+LOADED_MARKER = 0
+
+# Заполняем множество, только если с момента чтения поколения его не инвалидировали.
+# ARGV: поколение, TTL, затем члены множества (SADD порциями из-за ограничения unpack)
+FILL_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 3, #ARGV, 5000 do
+    redis.call('SADD', KEYS[1], unpack(ARGV, i, math.min(i + 4999, #ARGV)))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+fill_if_generation = redis_client.register_script(FILL_SCRIPT)
+
+
+class RelationshipCache:
+    """
+    Кэш подписок пользователя в Redis: SET relationships:following:{user_id} и relationships:followers:{user_id}.
+    Множества кладутся только для аккаунтов, где они не больше RELATIONSHIPS_CACHE_MAX_SET
+    """
+
+    @classmethod
+    def following_key(cls, user_id: int) -> str:
+        return f"relationships:following:{user_id}"
+
+    @classmethod
+    def followers_key(cls, user_id: int) -> str:
+        return f"relationships:followers:{user_id}"
+
+    @classmethod
+    async def get(cls, user_id: int, user_ids: list[int]) -> tuple[Optional[list[bool]], Optional[list[bool]]]:
+        """
+        Флаги "я подписан" и "подписан на меня". None - множество не закэшировано
+        """
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.smismember(cls.following_key(user_id), [LOADED_MARKER, *user_ids])
+            pipe.smismember(cls.followers_key(user_id), [LOADED_MARKER, *user_ids])
+            following, followers = await pipe.execute()
+
+        return (
+            [bool(flag) for flag in following[1:]] if following[0] else None,
+            [bool(flag) for flag in followers[1:]] if followers[0] else None
+        )
+
+    @classmethod
+    def generation_key(cls, key: str) -> str:
+        return f"{key}:generation"
+
+    @classmethod
+    async def generation(cls, key: str) -> str:
+        """
+        Поколение читаем до запроса в БД и передаем в fill
+        """
+        return await redis_client.get(cls.generation_key(key)) or "0"
+
+    @classmethod
+    async def fill(cls, key: str, generation: str, user_ids: list[int]) -> bool:
+        return bool(await fill_if_generation(
+            keys=[key, cls.generation_key(key)],
+            args=[generation, settings.RELATIONSHIPS_CACHE_TTL_SECONDS, LOADED_MARKER, *user_ids]
+        ))
+
+    @classmethod
+    async def invalidate(cls, follower_id: int, following_id: int):
+        async with redis_client.pipeline(transaction=True) as pipe:
+            for key in (cls.following_key(follower_id), cls.followers_key(following_id)):
+                pipe.incr(cls.generation_key(key))
+                pipe.expire(cls.generation_key(key), settings.RELATIONSHIPS_CACHE_TTL_SECONDS)
+                pipe.delete(key)
+            await pipe.execute()
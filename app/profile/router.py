@@ -1,11 +1,14 @@
 from typing import Optional
 
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, status, Depends, Query
 
-from app.profile.schemas import SProfileUser, SFollowersList, SFollowingList
+from app.profile.schemas import (
+    SProfileUser, SFollowersList, SFollowingList, SProfileCard, SProfilePostsPage, SFollowInfoPage, SRecommendation,
+    SMutuals, SRelationshipsRequest, SRelationship
+)
 from app.profile.services import ProfileService
 from app.user.dependencies import get_current_active_user
-from app.user.models import User
+from app.user.schemas import SPrincipal
 
 router_profile = APIRouter(
     prefix="/profile",
@@ -18,21 +21,68 @@ async def get_profile(username: str) -> Optional[SProfileUser]:
     return await ProfileService.service_get_existing_user(username)
 
 
+@router_profile.get("/user/{username}/card")
+async def get_profile_card(username: str) -> SProfileCard:
+    return await ProfileService.service_get_profile_card(username)
+
+
+@router_profile.get("/user/{username}/posts")
+async def get_profile_posts(username: str, cursor: str = None) -> SProfilePostsPage:
+    return await ProfileService.service_get_profile_posts(username, cursor)
+
+
+@router_profile.get("/user/{username}/followers")
+async def get_profile_followers(username: str, cursor: str = None) -> SFollowInfoPage:
+    return await ProfileService.service_get_profile_followers(username, cursor)
+
+
+@router_profile.get("/user/{username}/following")
+async def get_profile_following(username: str, cursor: str = None) -> SFollowInfoPage:
+    return await ProfileService.service_get_profile_following(username, cursor)
+
+
+@router_profile.get("/user/{username}/mutuals")
+async def get_mutuals(username: str, current_user: SPrincipal = Depends(get_current_active_user)) -> SMutuals:
+    return await ProfileService.service_get_mutuals(current_user.id, username)
+
+
+@router_profile.get("/recommendations")
+async def get_recommendations(
+        limit: int = Query(10, ge=1, le=100), current_user: SPrincipal = Depends(get_current_active_user)
+) -> list[SRecommendation]:
+    return await ProfileService.service_get_recommendations(current_user.id, limit)
+
+
+@router_profile.post("/relationships")
+async def get_relationships(
+        relationships: SRelationshipsRequest, current_user: SPrincipal = Depends(get_current_active_user)
+) -> list[SRelationship]:
+    return await ProfileService.service_get_relationships(current_user.id, relationships.user_ids)
+
+
 @router_profile.post("/follow/{username}", status_code=status.HTTP_201_CREATED)
-async def follow(username: str, current_user: User = Depends(get_current_active_user)):
-    return await ProfileService.service_follow(current_user.first_name, username)
+async def follow(username: str, current_user: SPrincipal = Depends(get_current_active_user)):
+    return await ProfileService.service_follow(current_user.id, current_user.first_name, username)
 
 
 @router_profile.post("/unfollow/{username}", status_code=status.HTTP_201_CREATED)
-async def unfollow(username: str, current_user: User = Depends(get_current_active_user)):
-    return await ProfileService.service_unfollow(current_user.first_name, username)
+async def unfollow(username: str, current_user: SPrincipal = Depends(get_current_active_user)):
+    return await ProfileService.service_unfollow(current_user.id, current_user.first_name, username)
 
 
 @router_profile.get("/followers")
-async def get_followers(current_user: User = Depends(get_current_active_user)) -> list[SFollowersList]:
-    return await ProfileService.service_get_followers(current_user.id)
+async def get_followers(
+        cursor: str = None,
+        limit: int = Query(20, ge=1, le=100),
+        current_user: SPrincipal = Depends(get_current_active_user)
+) -> SFollowersList:
+    return await ProfileService.service_get_followers(current_user.id, cursor, limit)
 
 
 @router_profile.get("/following")
-async def get_following(current_user: User = Depends(get_current_active_user)) -> list[SFollowingList]:
-    return await ProfileService.service_get_following(current_user.id)
+async def get_following(
+        cursor: str = None,
+        limit: int = Query(20, ge=1, le=100),
+        current_user: SPrincipal = Depends(get_current_active_user)
+) -> SFollowingList:
+    return await ProfileService.service_get_following(current_user.id, cursor, limit)
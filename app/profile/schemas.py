@@ -6,30 +6,71 @@ from app.post.schemas import SPostProfile
 from app.user.schemas import SUserInfo, SFollowInfo
 
 
-class SProfileUser(SUserInfo):
+class SProfileCard(SUserInfo):
     followers_count: int = 0
     following_count: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SProfileUser(SProfileCard):
     posts: list[SPostProfile]
     followers: list[SFollowInfo]
     following: list[SFollowInfo]
+    posts_next_cursor: Optional[str] = None
+    followers_next_cursor: Optional[str] = None
+    following_next_cursor: Optional[str] = None
 
-    model_config = ConfigDict(from_attributes=True)
+
+class SProfilePostsPage(BaseModel):
+    posts: list[SPostProfile]
+    next_cursor: Optional[str] = None
+
+
+class SFollowInfoPage(BaseModel):
+    follows: list[SFollowInfo]
+    next_cursor: Optional[str] = None
 
 
 class SFollowProfile(BaseModel):
+    id: int
     image: Optional[str]
+    image_thumbnail: Optional[str] = None
     first_name: Optional[str] = Field(None)
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class SRecommendation(SFollowProfile):
+    mutual_count: int
+
+
+class SMutuals(BaseModel):
+    followed_by_count: int
+    followed_by: list[SFollowProfile]
+    common_followers_count: int
+    distance: Optional[int] = None
+
+
+class SRelationshipsRequest(BaseModel):
+    user_ids: list[int] = Field(..., max_length=300)
+
+
+class SRelationship(BaseModel):
+    user_id: int
+    following: bool
+    followed_by: bool
+
+
 class SFollowersList(BaseModel):
     followers: list[SFollowProfile] = []
+    next_cursor: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
 class SFollowingList(BaseModel):
     following: list[SFollowProfile] = []
+    next_cursor: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
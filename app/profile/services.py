@@ -1,128 +1,355 @@
+import asyncio
 from typing import Optional
 
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.activity.dao import ActivityDAO
+from app.config import settings
+from app.counters import TouchedCounters, TOUCHED_USERS_KEY
 from app.database import async_session_maker
 from app.exceptions import UserNotFound
+from app.logger import logger
+from app.pagination import encode_cursor, decode_id_cursor
+from app.post.dao import PostDAO
+from app.post.schemas import SPostProfile
+from app.post.timeline import TimelineCache
+from app.profile.cache import profile_card_cache
+from app.profile.graph import follow_graph
+from app.profile.relationships import RelationshipCache
 from app.profile.dao import ProfileUserDAO, ProfileFollowDAO
-from app.profile.schemas import SProfileUser, SFollowersList, SFollowingList
+from app.profile.schemas import (
+    SProfileUser, SFollowersList, SFollowingList, SProfileCard, SProfilePostsPage, SFollowInfoPage, SFollowProfile,
+    SRecommendation, SMutuals, SRelationship
+)
+from app.user.schemas import SFollowInfo
+
+
+# Ключи множеств, которые сейчас прогреваются, и ссылки на фоновые задачи прогрева
+warming_relationships: set[str] = set()
+background_tasks: set[asyncio.Task] = set()
 
 
 class ProfileService:
     @classmethod
-    async def service_existing_user(cls, session: AsyncSession, username: str) -> Optional[SProfileUser]:
-        user = await ProfileUserDAO.db_get_profile(session, first_name=username)
+    async def service_existing_user(cls, session: AsyncSession, username: str):
+        user = await ProfileUserDAO.find_one_or_none(session, first_name=username)
 
         if not user:
             raise UserNotFound
 
         return user
 
+    @classmethod
+    async def service_get_profile_card(cls, username: str) -> SProfileCard:
+        """ Шапка профиля из кэша (LRU процесса -> Redis -> БД).
+        Заполнение, прочитавшее БД до инвалидации, в кэш не попадает
+        """
+        cached_card = await profile_card_cache.get(username)
+
+        if cached_card:
+            return SProfileCard.model_validate_json(cached_card)
+
+        version = await profile_card_cache.version(username)
+
+        async with async_session_maker() as session:
+            user = await cls.service_existing_user(session, username)
+
+        card = SProfileCard.model_validate(user)
+        await profile_card_cache.set(username, card.model_dump_json(), version)
+
+        return card
+
     @classmethod
     async def service_get_existing_user(cls, username: str) -> Optional[SProfileUser]:
+        """ Профиль: шапка и первые страницы постов, подписчиков и подписок
+        """
+        card = await cls.service_get_profile_card(username)
+        limit = settings.PROFILE_PAGE_SIZE
+
         async with async_session_maker() as session:
-            return await cls.service_existing_user(session, username)
+            posts = await PostDAO.db_get_user_posts_page(session, card.id, None, limit)
+            followers = await ProfileFollowDAO.db_get_followers_page(session, card.id, None, limit)
+            following = await ProfileFollowDAO.db_get_following_page(session, card.id, None, limit)
+
+        return SProfileUser(
+            **card.model_dump(),
+            posts=[SPostProfile.model_validate(post) for post in posts],
+            followers=[SFollowInfo.model_validate(follow) for follow in followers],
+            following=[SFollowInfo.model_validate(follow) for follow in following],
+            posts_next_cursor=encode_cursor(posts[-1].id) if len(posts) == limit else None,
+            followers_next_cursor=encode_cursor(followers[-1].follower_id) if len(followers) == limit else None,
+            following_next_cursor=encode_cursor(following[-1].following_id) if len(following) == limit else None
+        )
 
     @classmethod
-    async def service_get_follower_and_following(cls, session: AsyncSession, follower: str, following: str):
-        db_follower = await cls.service_existing_user(session, follower)
-        db_following = await cls.service_existing_user(session, following)
+    async def service_get_profile_posts(cls, username: str, cursor: Optional[str] = None) -> SProfilePostsPage:
+        card = await cls.service_get_profile_card(username)
+        limit = settings.PROFILE_PAGE_SIZE
 
-        if not (db_follower or db_following):
-            return False
+        async with async_session_maker() as session:
+            posts = await PostDAO.db_get_user_posts_page(session, card.id, decode_id_cursor(cursor), limit)
 
-        return db_follower, db_following
+        return SProfilePostsPage(
+            posts=[SPostProfile.model_validate(post) for post in posts],
+            next_cursor=encode_cursor(posts[-1].id) if len(posts) == limit else None
+        )
 
     @classmethod
-    async def service_follow(cls, follower: str, following: str):
-        """ Подписаться на кого-то
-        """
+    async def service_get_profile_followers(cls, username: str, cursor: Optional[str] = None) -> SFollowInfoPage:
+        card = await cls.service_get_profile_card(username)
+        limit = settings.PROFILE_PAGE_SIZE
+
         async with async_session_maker() as session:
-            db_follower, db_following = await cls.service_get_follower_and_following(session, follower, following)
+            followers = await ProfileFollowDAO.db_get_followers_page(session, card.id, decode_id_cursor(cursor), limit)
 
-            db_follow = await ProfileFollowDAO.find_one_or_none(
-                session, follower_id=db_follower.id, following_id=db_following.id
-            )
+        return SFollowInfoPage(
+            follows=[SFollowInfo.model_validate(follow) for follow in followers],
+            next_cursor=encode_cursor(followers[-1].follower_id) if len(followers) == limit else None
+        )
 
-            if db_follow:
+    @classmethod
+    async def service_get_profile_following(cls, username: str, cursor: Optional[str] = None) -> SFollowInfoPage:
+        card = await cls.service_get_profile_card(username)
+        limit = settings.PROFILE_PAGE_SIZE
+
+        async with async_session_maker() as session:
+            following = await ProfileFollowDAO.db_get_following_page(session, card.id, decode_id_cursor(cursor), limit)
+
+        return SFollowInfoPage(
+            follows=[SFollowInfo.model_validate(follow) for follow in following],
+            next_cursor=encode_cursor(following[-1].following_id) if len(following) == limit else None
+        )
+
+    @classmethod
+    async def service_invalidate_profile_cards(cls, *usernames: Optional[str]):
+        for username in usernames:
+            if username:
+                await profile_card_cache.delete(username)
+
+    @classmethod
+    async def service_get_user_id(cls, session: AsyncSession, username: str) -> int:
+        user_id = await ProfileUserDAO.db_get_user_id(session, username)
+
+        if not user_id:
+            raise UserNotFound
+
+        return user_id
+
+    @classmethod
+    async def service_reset_timeline(cls, user_id: int):
+        """ Сбрасываем домашнюю ленту после смены подписок, она соберется заново при чтении
+        """
+        try:
+            await TimelineCache.invalidate(user_id)
+        except RedisError:
+            logger.error("Redis Exc: Cannot reset timeline", exc_info=True)
+
+    @classmethod
+    async def service_reset_relationships(cls, follower_id: int, following_id: int):
+        try:
+            await RelationshipCache.invalidate(follower_id, following_id)
+        except RedisError:
+            logger.error("Redis Exc: Cannot reset relationships", exc_info=True)
+
+    @classmethod
+    async def service_follow(cls, follower_id: int, follower: str, following: str):
+        """ Подписаться на кого-то: вставка в follow и оба счетчика одним запросом
+        """
+        async with async_session_maker() as session:
+            following_id = await cls.service_get_user_id(session, following)
+
+            if following_id == follower_id:
                 return False
 
-            await ProfileFollowDAO.add(
-                session, follower_id=db_follower.id, following_id=db_following.id
-            )
+            db_follower = await ProfileFollowDAO.db_follow(session, follower_id, following_id)
 
-            db_follower.following_count += 1
-            db_following.followers_count += 1
+            if not db_follower:
+                return False
 
             await ActivityDAO.add(
                 session,
                 username=following,
-                followed_username=db_follower.first_name,
-                followed_user_image=db_follower.image
+                followed_username=db_follower["first_name"],
+                followed_user_image=db_follower["image"]
             )
 
             await session.commit()
 
+        follow_graph.add_edge(follower_id, following_id)
+
+        await cls.service_reset_relationships(follower_id, following_id)
+        await TouchedCounters.mark(TOUCHED_USERS_KEY, follower_id, following_id)
+
+        await cls.service_reset_timeline(follower_id)
+        await cls.service_invalidate_profile_cards(follower, following)
+
         return {"message": "Вы успешно подписались"}
 
     @classmethod
-    async def service_unfollow(cls, follower: str, following: str):
-        """ Отписаться от кого-то
+    async def service_unfollow(cls, follower_id: int, follower: str, following: str):
+        """ Отписаться от кого-то: удаление из follow и оба счетчика одним запросом
         """
         async with async_session_maker() as session:
-            db_follower, db_following = await cls.service_get_follower_and_following(session, follower, following)
-
-            db_follow = await ProfileFollowDAO.find_one_or_none(
-                session, follower_id=db_follower.id, following_id=db_following.id
-            )
+            following_id = await cls.service_get_user_id(session, following)
 
-            if not db_follow:
+            if not await ProfileFollowDAO.db_unfollow(session, follower_id, following_id):
                 return False
 
-            await ProfileFollowDAO.delete(session, follower_id=db_follower.id)
+            await session.commit()
 
-            db_follower.following_count -= 1
-            db_following.followers_count -= 1
+        follow_graph.remove_edge(follower_id, following_id)
 
-            await session.commit()
+        await cls.service_reset_relationships(follower_id, following_id)
+        await TouchedCounters.mark(TOUCHED_USERS_KEY, follower_id, following_id)
+
+        await cls.service_reset_timeline(follower_id)
+        await cls.service_invalidate_profile_cards(follower, following)
 
         return {"message": "Вы успешно отписались"}
 
     @classmethod
-    async def service_get_followers(cls, user_id: int) -> list[SFollowersList]:
-        """ Получаем подписчиков
+    async def service_get_followers(cls, user_id: int, cursor: Optional[str] = None, limit: int = 20) -> SFollowersList:
+        """ Получаем подписчиков постранично
+        """
+        async with async_session_maker() as session:
+            followers = await ProfileFollowDAO.db_get_followers_projection(
+                session, user_id, decode_id_cursor(cursor), limit
+            )
+
+        return SFollowersList(
+            followers=[SFollowProfile(**follower) for follower in followers],
+            next_cursor=encode_cursor(followers[-1]["id"]) if len(followers) == limit else None
+        )
+
+    @classmethod
+    async def service_get_following(cls, user_id: int, cursor: Optional[str] = None, limit: int = 20) -> SFollowingList:
+        """ Получаем на кого подписались постранично
         """
         async with async_session_maker() as session:
-            db_followers = await ProfileFollowDAO.db_get_followers_with_user(session, user_id)
+            following = await ProfileFollowDAO.db_get_following_projection(
+                session, user_id, decode_id_cursor(cursor), limit
+            )
 
-            followers = []
+        return SFollowingList(
+            following=[SFollowProfile(**user) for user in following],
+            next_cursor=encode_cursor(following[-1]["id"]) if len(following) == limit else None
+        )
 
-            for user in db_followers:
-                followers.append(
-                    {
-                        "image": user.follower.image,
-                        "first_name": user.follower.first_name
-                    }
-                )
+    @classmethod
+    async def service_get_recommendations(cls, user_id: int, limit: int = 10) -> list[SRecommendation]:
+        """ Возможно, вы знакомы: друзья друзей из графа подписок в памяти
+        """
+        graph = await follow_graph.get()
+        recommendations = dict(graph.recommendations(user_id, limit))
+
+        async with async_session_maker() as session:
+            users = await ProfileUserDAO.db_get_users_projection(session, list(recommendations))
 
-        return [SFollowersList(followers=followers)]
+        return [SRecommendation(**user, mutual_count=recommendations[user["id"]]) for user in users]
 
     @classmethod
-    async def service_get_following(cls, user_id: int) -> list[SFollowingList]:
-        """ Получаем на кого подписались
+    async def service_get_mutuals(cls, user_id: int, username: str, limit: int = 3) -> SMutuals:
+        """ Общие связи с пользователем: на кого я подписан из его подписчиков, общие подписчики и расстояние
         """
         async with async_session_maker() as session:
-            db_following = await ProfileFollowDAO.db_get_following_with_user(session, user_id)
+            target_id = await cls.service_get_user_id(session, username)
+
+            graph = await follow_graph.get()
+            followed_by = graph.followed_by_following(user_id, target_id)
+
+            users = await ProfileUserDAO.db_get_users_projection(
+                session, [int(follower_id) for follower_id in followed_by[:limit]]
+            )
+
+        return SMutuals(
+            followed_by_count=len(followed_by),
+            followed_by=[SFollowProfile(**user) for user in users],
+            common_followers_count=len(graph.common_followers(user_id, target_id)),
+            distance=graph.distance(user_id, target_id)
+        )
+
+    @classmethod
+    async def service_warm_relationships(cls, user_id: int, following: bool, followers: bool):
+        """ Кладем в Redis множества подписок/подписчиков, если они небольшие.
+        Множество, инвалидированное во время чтения из БД, не записывается
+        """
+        following_key = RelationshipCache.following_key(user_id)
+        followers_key = RelationshipCache.followers_key(user_id)
+        max_set = settings.RELATIONSHIPS_CACHE_MAX_SET
+
+        try:
+            following_generation = await RelationshipCache.generation(following_key)
+            followers_generation = await RelationshipCache.generation(followers_key)
+
+            async with async_session_maker() as session:
+                user = await ProfileUserDAO.find_one_or_none(session, id=user_id)
+
+                if not user:
+                    return
+
+                if following and user.following_count <= max_set:
+                    following_ids = await ProfileFollowDAO.db_get_following_ids(session, user_id)
+                    await RelationshipCache.fill(following_key, following_generation, following_ids)
+
+                if followers and user.followers_count <= max_set:
+                    follower_ids = await ProfileFollowDAO.db_get_follower_ids(session, user_id)
+                    await RelationshipCache.fill(followers_key, followers_generation, follower_ids)
+        except RedisError:
+            logger.error("Redis Exc: Cannot warm relationships", exc_info=True)
+        except Exception:
+            logger.error("Unknown Exc: Cannot warm relationships", exc_info=True)
+        finally:
+            if following:
+                warming_relationships.discard(following_key)
+            if followers:
+                warming_relationships.discard(followers_key)
+
+    @classmethod
+    def service_schedule_warm_relationships(cls, user_id: int, following: bool, followers: bool):
+        """ Прогрев идет фоном, вне запроса. Один прогрев множества за раз на процесс
+        """
+        following = following and RelationshipCache.following_key(user_id) not in warming_relationships
+        followers = followers and RelationshipCache.followers_key(user_id) not in warming_relationships
+
+        if not (following or followers):
+            return
+
+        if following:
+            warming_relationships.add(RelationshipCache.following_key(user_id))
+        if followers:
+            warming_relationships.add(RelationshipCache.followers_key(user_id))
+
+        task = asyncio.create_task(cls.service_warm_relationships(user_id, following, followers))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+    @classmethod
+    async def service_get_relationships(cls, user_id: int, user_ids: list[int]) -> list[SRelationship]:
+        """ Флаги "я подписан"/"подписан на меня" для списка пользователей
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+
+        try:
+            following, followers = await RelationshipCache.get(user_id, user_ids)
+        except RedisError:
+            logger.error("Redis Exc: Cannot read relationships", exc_info=True)
+            following, followers = None, None
+
+        missing_following, missing_followers = following is None, followers is None
+
+        if missing_following or missing_followers:
+            async with async_session_maker() as session:
+                edges = set(await ProfileFollowDAO.db_get_relationships(session, user_id, user_ids))
 
-            following = []
+                if missing_following:
+                    following = [(user_id, other_id) in edges for other_id in user_ids]
+                if missing_followers:
+                    followers = [(other_id, user_id) in edges for other_id in user_ids]
 
-            for user in db_following:
-                following.append(
-                    {
-                        "image": user.following.image,
-                        "first_name": user.following.first_name
-                    }
-                )
+            cls.service_schedule_warm_relationships(user_id, following=missing_following, followers=missing_followers)
 
-        return [SFollowingList(following=following)]
+        return [
+            SRelationship(user_id=other_id, following=is_following, followed_by=is_follower)
+            for other_id, is_following, is_follower in zip(user_ids, following, followers)
+        ]
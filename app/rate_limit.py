@@ -0,0 +1,97 @@
+from fastapi import Request
+from jose import jwt, JWTError
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.database import pool_wait_monitor
+from app.exceptions import TooManyRequestsException, ServiceOverloadedException
+from app.logger import logger
+from app.metrics import metrics
+from app.redis_client import redis_client
+
+
+# Token bucket: HASH {tokens, ts}. Пополнение считается по времени Redis, поэтому часы воркеров не важны.
+# Возвращает 0, если запрос пропущен, иначе через сколько миллисекунд появится токен
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate))
+return wait
+"""
+
+token_bucket = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов по политикам из settings.RATE_LIMITS: {policy: (capacity, tokens_per_second)}.
+    Ключ - пользователь из access-токена, а без него - IP. Отказ не доходит до БД
+    """
+
+    @classmethod
+    def key(cls, policy: str, identity: str) -> str:
+        return f"rate_limit:{policy}:{identity}"
+
+    @classmethod
+    def identity(cls, request: Request) -> str:
+        token = request.cookies.get("access_token")
+
+        if token:
+            try:
+                user_id = jwt.decode(token, settings.SECRET_KEY, settings.ALGORITHM).get("sub")
+            except JWTError:
+                user_id = None
+
+            if user_id:
+                return f"user:{user_id}"
+
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+
+    @classmethod
+    async def check(cls, policy: str, identity: str):
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+
+        if pool_wait_monitor.overloaded():
+            metrics.incr(f"rate_limit.{policy}.shed")
+            raise ServiceOverloadedException
+
+        capacity, rate = settings.RATE_LIMITS[policy]
+
+        try:
+            wait_ms = await token_bucket(keys=[cls.key(policy, identity)], args=[capacity, rate])
+        except RedisError:
+            # Без Redis пропускаем запрос: лимитер не должен ронять API
+            logger.error("Redis Exc: Cannot check rate limit", exc_info=True)
+            return
+
+        if wait_ms:
+            metrics.incr(f"rate_limit.{policy}.rejected")
+            raise TooManyRequestsException(retry_after=-(-wait_ms // 1000))
+
+
+def rate_limit(policy: str):
+    """
+    Зависимость FastAPI: Depends(rate_limit("login"))
+    """
+    async def dependency(request: Request):
+        await RateLimiter.check(policy, RateLimiter.identity(request))
+
+    return dependency
@@ -0,0 +1,17 @@
+import redis
+from redis import asyncio as aioredis
+
+from app.config import settings
+
+
+redis_client = aioredis.from_url(
+    f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
+    decode_responses=True
+)
+
+# Синхронный клиент для задач Celery
+sync_redis_client = redis.Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    decode_responses=True
+)
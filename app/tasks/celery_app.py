@@ -1,5 +1,11 @@
 from celery import Celery
+from celery.signals import task_postrun
+from redis.exceptions import RedisError
+
 from app.config import settings
+from app.logger import logger
+from app.metrics import metrics
+from app.redis_client import sync_redis_client
 
 
 celery = Celery(
@@ -7,3 +13,41 @@ celery = Celery(
     broker=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
     include=["app.tasks.tasks"]
 )
+
+celery.conf.beat_schedule = {
+    "rebuild-trending-hashtags": {
+        "task": "app.tasks.tasks.rebuild_trending_hashtags",
+        "schedule": 60.0,
+    },
+    "flush-like-counters": {
+        "task": "app.tasks.tasks.flush_like_counters",
+        "schedule": float(settings.LIKES_FLUSH_INTERVAL_SECONDS),
+    },
+    "purge-expired-verifications": {
+        "task": "app.tasks.tasks.purge_expired_verifications",
+        "schedule": float(settings.VERIFICATION_SWEEP_INTERVAL_SECONDS),
+    },
+    "collect-orphaned-uploads": {
+        "task": "app.tasks.tasks.collect_orphaned_uploads",
+        "schedule": float(settings.UPLOAD_GC_INTERVAL_SECONDS),
+    },
+    "reconcile-touched-counters": {
+        "task": "app.tasks.tasks.reconcile_counters",
+        "schedule": float(settings.COUNTERS_RECONCILE_INTERVAL_SECONDS),
+    },
+    "reconcile-all-counters": {
+        "task": "app.tasks.tasks.reconcile_counters",
+        "schedule": float(settings.COUNTERS_FULL_RECONCILE_INTERVAL_SECONDS),
+        "kwargs": {"full": True},
+    },
+}
+
+
+@task_postrun.connect
+def push_task_metrics(**kwargs):
+    """ Метрики живут в памяти процесса воркера: после каждой задачи сбрасываем их в Redis для /metrics
+    """
+    try:
+        metrics.push(sync_redis_client)
+    except RedisError:
+        logger.error("Redis Exc: Cannot push task metrics", exc_info=True)
@@ -1,8 +1,30 @@
+import asyncio
+import os
 import smtplib
+import time
+from contextlib import contextmanager
+
+from redis.exceptions import LockError
 
 from app.config import settings
+from app.counters import TouchedCounters, TOUCHED_USERS_KEY, TOUCHED_POSTS_KEY
+from app.database import async_session_maker_nullpool
+from app.image_utils import create_variants
+from app.logger import logger
+from app.metrics import metrics
+from app.post.dao import PostDAO, PostImageDAO, HashtagDAO
+from app.post.cache import post_cache
+from app.post.like_counter import LikeCounter
+from app.post.models import Post, PostLikesAssociation, Hashtag, PostHashtagAssociation
+from app.post.trending import TrendingHashtags
+from app.post.upload_gc import UploadCollector
+from app.profile.cache import profile_card_cache
+from app.profile.dao import ProfileUserDAO
+from app.redis_client import sync_redis_client
 from app.tasks.celery_app import celery
 from app.tasks.email_templates import create_user_verification_template
+from app.user.dao import UserDAO, VerificationSessionDAO
+from app.user.models import User, Follow
 
 
 @celery.task
@@ -14,3 +36,321 @@ def send_email_report_dashboard(user: dict, verification_token: str):
     with smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT) as server:
         server.login(settings.SMTP_USER, settings.SMTP_PASS)
         server.send_message(email)
+
+
+@celery.task
+def rebuild_trending_hashtags():
+    """ Сдвигаем скользящие окна популярных хэштегов
+    """
+    TrendingHashtags.rebuild_windows(sync_redis_client)
+
+
+async def apply_like_deltas(batch_id: str, deltas: dict[int, int]) -> bool:
+    async with async_session_maker_nullpool() as session:
+        return await LikeCounter.apply(session, batch_id, deltas)
+
+
+def flush_like_batches() -> int:
+    """
+    Переносим пачки, пока есть что переносить. В режиме write-behind - одну пачку за запуск,
+    после выключения режима дочищаем оставшиеся дельты до конца
+    """
+    flushed = 0
+
+    while True:
+        batch_id, deltas = LikeCounter.take_pending(sync_redis_client)
+
+        if not batch_id:
+            break
+
+        if deltas and not asyncio.run(apply_like_deltas(batch_id, deltas)):
+            logger.warning("Like counters batch already applied", extra={"batch_id": batch_id})
+
+        LikeCounter.ack(sync_redis_client, batch_id)
+
+        if deltas:
+            post_cache.delete_sync(sync_redis_client, *deltas)
+
+        flushed += len(deltas)
+
+        if settings.LIKES_WRITE_BEHIND:
+            break
+
+    return flushed
+
+
+@celery.task
+def flush_like_counters():
+    """ Переносим накопленные в Redis дельты лайков в post.likes_count
+    """
+    lock = LikeCounter.flush_lock(sync_redis_client)
+
+    if not lock.acquire(blocking=False):
+        logger.info("Like counters flush is already running")
+        return 0
+
+    try:
+        flushed = flush_like_batches()
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("Like counters flush lock expired before release")
+
+    logger.info("Like counters flushed", extra={"posts": flushed})
+
+    return flushed
+
+
+async def reconcile_user_counters(*where) -> int:
+    async with async_session_maker_nullpool() as session:
+        followers = await ProfileUserDAO.db_reconcile_count(session, User.followers_count, Follow.following_id, *where)
+        following = await ProfileUserDAO.db_reconcile_count(session, User.following_count, Follow.follower_id, *where)
+        await session.commit()
+
+    return len(set(followers) | set(following))
+
+
+@contextmanager
+def like_flush_paused():
+    """
+    Пока сверяется чанк постов, дельты лайков не переносятся, а список постов с дельтами
+    читается заново прямо перед UPDATE: их likes_count в БД временно отстает и сверять его нельзя
+    """
+    if not settings.LIKES_WRITE_BEHIND:
+        yield set()
+        return
+
+    lock = LikeCounter.flush_lock(sync_redis_client)
+
+    if not lock.acquire(blocking_timeout=settings.LIKES_FLUSH_LOCK_SECONDS):
+        raise LockError("Cannot pause like counters flush")
+
+    try:
+        yield LikeCounter.pending_post_ids(sync_redis_client)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("Like counters flush lock expired before release")
+
+
+async def reconcile_post_counters(*where) -> tuple[int, set[int]]:
+    """
+    Возвращает число исправленных постов и id постов с неперенесенными дельтами, которые пропустили
+    """
+    with like_flush_paused() as pending_ids:
+        if pending_ids:
+            where += (Post.id.not_in(pending_ids),)
+
+        async with async_session_maker_nullpool() as session:
+            post_ids = await PostDAO.db_reconcile_count(session, Post.likes_count, PostLikesAssociation.post_id, *where)
+            await session.commit()
+
+    if post_ids:
+        post_cache.delete_sync(sync_redis_client, *post_ids)
+
+    return len(post_ids), pending_ids
+
+
+async def reconcile_hashtag_counters(*where) -> int:
+    async with async_session_maker_nullpool() as session:
+        hashtag_ids = await HashtagDAO.db_reconcile_count(
+            session, Hashtag.posts_count, PostHashtagAssociation.hashtag_id, *where
+        )
+        await session.commit()
+
+    return len(hashtag_ids)
+
+
+async def reconcile_all() -> dict[str, int]:
+    """
+    Полная сверка: идем по диапазонам первичного ключа, по одному чанку на транзакцию
+    """
+    chunk_size = settings.COUNTERS_RECONCILE_CHUNK_SIZE
+    corrected = {"user": 0, "post": 0, "hashtag": 0}
+
+    async with async_session_maker_nullpool() as session:
+        max_user_id = await ProfileUserDAO.db_get_max_id(session)
+        max_post_id = await PostDAO.db_get_max_id(session)
+        max_hashtag_id = await HashtagDAO.db_get_max_id(session)
+
+    for start in range(0, max_user_id, chunk_size):
+        corrected["user"] += await reconcile_user_counters(User.id > start, User.id <= start + chunk_size)
+
+    for start in range(0, max_post_id, chunk_size):
+        # Пропущенные посты с дельтами после переноса попадут в затронутые и сверятся инкрементально
+        post_count, _ = await reconcile_post_counters(Post.id > start, Post.id <= start + chunk_size)
+        corrected["post"] += post_count
+
+    for start in range(0, max_hashtag_id, chunk_size):
+        corrected["hashtag"] += await reconcile_hashtag_counters(
+            Hashtag.id > start, Hashtag.id <= start + chunk_size
+        )
+
+    return corrected
+
+
+async def reconcile_touched(user_chunks: list[list[int]], post_chunks: list[list[int]]) -> dict[str, int]:
+    corrected = {"user": 0, "post": 0}
+    postponed = []
+
+    for user_ids in user_chunks:
+        corrected["user"] += await reconcile_user_counters(User.id.in_(user_ids))
+
+    for post_ids in post_chunks:
+        post_count, pending_ids = await reconcile_post_counters(Post.id.in_(post_ids))
+        corrected["post"] += post_count
+        postponed += [post_id for post_id in post_ids if post_id in pending_ids]
+
+    if postponed:
+        # Посты с неперенесенными дельтами сверим в следующий запуск
+        sync_redis_client.sadd(TOUCHED_POSTS_KEY, *postponed)
+
+    return corrected
+
+
+def take_touched(key: str) -> list[list[int]]:
+    """
+    Разбираем SET затронутых id чанками
+    """
+    chunks = []
+
+    while chunk := TouchedCounters.take(sync_redis_client, key, settings.COUNTERS_RECONCILE_CHUNK_SIZE):
+        chunks.append(chunk)
+
+    return chunks
+
+
+@celery.task
+def reconcile_counters(full: bool = False):
+    """ Сверяем followers_count, following_count, likes_count и posts_count хэштегов с реальными связями.
+    По умолчанию - только строки, затронутые с прошлого запуска, full=True - все таблицы
+    """
+    start = time.perf_counter()
+
+    if full:
+        corrected = asyncio.run(reconcile_all())
+    else:
+        corrected = asyncio.run(reconcile_touched(take_touched(TOUCHED_USERS_KEY), take_touched(TOUCHED_POSTS_KEY)))
+
+    elapsed = time.perf_counter() - start
+    metrics.observe("counters.reconcile", elapsed)
+
+    for table, count in corrected.items():
+        metrics.incr(f"counters.corrected.{table}", count)
+
+    logger.info("Counters reconciled", extra={"full": full, "seconds": round(elapsed, 3), **corrected})
+
+    return corrected
+
+
+async def purge_verification_batch(batch_size: int) -> tuple[int, int, float]:
+    """
+    Одна короткая транзакция: блокировки держатся только на время одного батча.
+    Время батча считаем после установки соединения - с NullPool это новое подключение
+    """
+    async with async_session_maker_nullpool() as session:
+        await session.connection()
+
+        start = time.perf_counter()
+        users = await VerificationSessionDAO.db_purge_expired_users(session, batch_size)
+        sessions = await VerificationSessionDAO.db_purge_expired_sessions(session, batch_size)
+        await session.commit()
+        elapsed = time.perf_counter() - start
+
+    metrics.observe("verification_sweep.batch", elapsed)
+
+    return users, sessions, elapsed
+
+
+async def purge_verifications() -> dict:
+    batch_size = settings.VERIFICATION_SWEEP_BATCH_SIZE
+    purged = {"users": 0, "sessions": 0, "batches": 0, "batch_seconds_total": 0.0, "batch_seconds_max": 0.0}
+
+    for _ in range(settings.VERIFICATION_SWEEP_MAX_BATCHES):
+        users, sessions, elapsed = await purge_verification_batch(batch_size)
+        purged["users"] += users
+        purged["sessions"] += sessions
+        purged["batches"] += 1
+        purged["batch_seconds_total"] += elapsed
+        purged["batch_seconds_max"] = max(purged["batch_seconds_max"], elapsed)
+
+        if users < batch_size and sessions < batch_size:
+            break
+
+    return purged
+
+
+@celery.task
+def purge_expired_verifications():
+    """ Удаляем истекшие сессии подтверждения почты и так и не подтвержденных пользователей
+    """
+    purged = asyncio.run(purge_verifications())
+
+    for name in ("users", "sessions"):
+        metrics.incr(f"verification_sweep.purged.{name}", purged[name])
+
+    purged["batch_seconds_total"] = round(purged["batch_seconds_total"], 3)
+    purged["batch_seconds_max"] = round(purged["batch_seconds_max"], 3)
+
+    logger.info("Expired verifications purged", extra=purged)
+
+    return purged
+
+
+async def save_image_variants(kind: str, row_id: int, image: str, variants: dict[str, str]):
+    post_ids, username = [], None
+
+    async with async_session_maker_nullpool() as session:
+        if kind == "post":
+            if await PostImageDAO.db_set_variants(session, row_id, image, variants):
+                post_ids = await PostDAO.db_get_post_ids_by_image(session, row_id)
+        else:
+            username = await UserDAO.db_set_image_variants(session, row_id, image, variants)
+
+        await session.commit()
+
+    # Варианты входят в закэшированные пост и шапку профиля
+    if post_ids:
+        post_cache.delete_sync(sync_redis_client, *post_ids)
+
+    if username:
+        profile_card_cache.delete_sync(sync_redis_client, username)
+
+
+@celery.task
+def generate_image_variants(kind: str, row_id: int, image: str):
+    """ Уменьшенные копии загруженного изображения поста (kind="post") или аватара (kind="user")
+    """
+    try:
+        with metrics.timer("image.variants"):
+            filenames = create_variants(f"app/static{image}", settings.IMAGE_VARIANTS, settings.IMAGE_QUALITY)
+    except FileNotFoundError:
+        logger.warning("Image removed before variants were created", extra={"image": image})
+        return {}
+
+    folder = os.path.dirname(image)
+    variants = {name: f"{folder}/{filename}" for name, filename in filenames.items()}
+
+    asyncio.run(save_image_variants(kind, row_id, image, variants))
+
+    return variants
+
+
+@celery.task
+def collect_orphaned_uploads(dry_run: bool = None):
+    """ Удаляем картинки, так и не прикрепленные к постам, и файлы без ссылок.
+    dry_run=True только считает, сколько байт освободилось бы
+    """
+    if dry_run is None:
+        dry_run = settings.UPLOAD_GC_DRY_RUN
+
+    report = asyncio.run(UploadCollector(async_session_maker_nullpool, dry_run).run())
+
+    for name in ("post_images", "files", "untracked_files", "bytes"):
+        metrics.incr(f"upload_gc.{name}", report[name])
+
+    logger.info("Orphaned uploads collected", extra=report)
+
+    return report
@@ -1,12 +1,13 @@
 import uuid
 from typing import Optional
 
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone, UTC
 from jose import jwt
 
 from app.config import settings
 from app.database import async_session_maker
+from app.profile.cache import profile_card_cache
+from app.user.cache import principal_cache
 from app.exceptions import (
     IncorrectEmailOrPasswordException,
     TokenAbsentException,
@@ -16,19 +17,19 @@ from app.exceptions import (
 )
 from app.user.dao import UserDAO, RefreshSessionDAO, VerificationSessionDAO
 from app.user.models import RefreshSession
+from app.user.password import hash_password, verify_password
+from app.user.refresh_sessions import RedisRefreshSessions
 from app.user.schemas import SToken, SUserInfo
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 class AuthService:
     @classmethod
-    def get_password_hash(cls, password: str) -> str:
-        return pwd_context.hash(password)
+    async def get_password_hash(cls, password: str) -> str:
+        return await hash_password(password)
 
     @classmethod
-    def verify_password(cls, plain_password, hashed_password) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(cls, plain_password, hashed_password) -> bool:
+        return await verify_password(plain_password, hashed_password)
 
     @classmethod
     async def create_token(cls, user_id: int) -> SToken:
@@ -36,6 +37,11 @@ class AuthService:
         refresh_token = cls.create_refresh_token()
         refresh_token_expires = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
 
+        if settings.REFRESH_SESSIONS_IN_REDIS:
+            await RedisRefreshSessions.create(user_id, refresh_token, int(refresh_token_expires.total_seconds()))
+
+            return SToken(access_token=access_token, refresh_token=refresh_token)
+
         async with async_session_maker() as session:
             await RefreshSessionDAO.add(
                 session,
@@ -71,13 +77,20 @@ class AuthService:
         async with async_session_maker() as session:
             db_user = await UserDAO.find_one_or_none(session, email=email)
 
-            if not (db_user and cls.verify_password(password, db_user.hashed_password)):
-                raise IncorrectEmailOrPasswordException
+        # Проверяем пароль уже после возврата соединения в пул
+        if not (db_user and await cls.verify_password(password, db_user.hashed_password)):
+            raise IncorrectEmailOrPasswordException
 
         return db_user
 
     @classmethod
     async def logout(cls, token: uuid.UUID) -> None:
+        if settings.REFRESH_SESSIONS_IN_REDIS:
+            if token:
+                await RedisRefreshSessions.revoke(token)
+
+            return
+
         async with async_session_maker() as session:
             refresh_session = await RefreshSessionDAO.find_one_or_none(session, refresh_token=token)
 
@@ -86,13 +99,30 @@ class AuthService:
 
             await session.commit()
 
+    @classmethod
+    async def logout_everywhere(cls, user_id: int) -> None:
+        """ Завершаем все refresh-сессии пользователя
+        """
+        if settings.REFRESH_SESSIONS_IN_REDIS:
+            await RedisRefreshSessions.revoke_all(user_id)
+            return
+
+        async with async_session_maker() as session:
+            await RefreshSessionDAO.delete(session, user_id=user_id)
+            await session.commit()
+
     @classmethod
     async def verify_email(cls, token: uuid.UUID):
         async with async_session_maker() as session:
             verification_session = await VerificationSessionDAO.find_one_or_none(session, verification_token=token)
+
+            # Сессию могла уже удалить периодическая очистка
+            if not verification_session:
+                raise NotVerifyUser
+
             user = await UserDAO.find_one_or_none(session, id=verification_session.user_id)
 
-            if not (verification_session or user):
+            if not user:
                 raise NotVerifyUser
 
             current_time = datetime.now(timezone.utc)
@@ -103,6 +133,8 @@ class AuthService:
                 await VerificationSessionDAO.delete(session, id=verification_session.id)
                 await session.commit()
 
+                await principal_cache.delete(user.id)
+
                 raise VerificationTokenExpired
 
             user.is_verified = True
@@ -110,10 +142,18 @@ class AuthService:
 
             await session.commit()
 
-            return {"message": "Адрес электронной почты успешно подтвержден"}
+        await principal_cache.delete(user.id)
+
+        if user.first_name:
+            await profile_card_cache.delete(user.first_name)
+
+        return {"message": "Адрес электронной почты успешно подтвержден"}
 
     @classmethod
     async def refresh_token(cls, token: uuid.UUID) -> SToken:
+        if settings.REFRESH_SESSIONS_IN_REDIS:
+            return await cls.refresh_token_redis(token)
+
         async with async_session_maker() as session:
             refresh_session = await RefreshSessionDAO.find_one_or_none(session, refresh_token=token)
 
@@ -144,3 +184,20 @@ class AuthService:
             await session.commit()
 
         return SToken(access_token=access_token, refresh_token=refresh_token)
+
+    @classmethod
+    async def refresh_token_redis(cls, token: uuid.UUID) -> SToken:
+        """ Истечение сессии - TTL ключа, ротация токена - один атомарный скрипт без обращения к БД
+        """
+        if not token:
+            raise TokenAbsentException
+
+        refresh_token = cls.create_refresh_token()
+        refresh_token_expires = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+
+        user_id = await RedisRefreshSessions.rotate(token, refresh_token, int(refresh_token_expires.total_seconds()))
+
+        if not user_id:
+            raise TokenAbsentException
+
+        return SToken(access_token=cls.create_access_token(user_id), refresh_token=refresh_token)
@@ -0,0 +1,11 @@
+from app.cache import RedisLRUCache
+from app.config import settings
+
+
+# Сериализованный SPrincipal по id пользователя
+principal_cache = RedisLRUCache(
+    "principal",
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    local_ttl=settings.PRINCIPAL_CACHE_LOCAL_TTL_SECONDS,
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE
+)
@@ -1,3 +1,9 @@
+from typing import Optional
+
+from sqlalchemy import select, update, delete, exists, func, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
 from app.dao.base import BaseDAO
 from app.user.models import User, RefreshSession, VerificationSession
 
@@ -5,6 +11,37 @@ from app.user.models import User, RefreshSession, VerificationSession
 class UserDAO(BaseDAO):
     model = User
 
+    @classmethod
+    async def db_get_principal(cls, session: AsyncSession, user_id: int):
+        """
+        Только поля, нужные для авторизации
+        """
+        query = (
+            select(
+                cls.model.id, cls.model.first_name, cls.model.is_active, cls.model.is_verified, cls.model.is_superuser
+            )
+            .filter_by(id=user_id)
+        )
+        result = await session.execute(query)
+        return result.mappings().one_or_none()
+
+
+    @classmethod
+    async def db_set_image_variants(
+            cls, session: AsyncSession, user_id: int, image: str, variants: dict[str, str]
+    ) -> Optional[str]:
+        """
+        Записываем варианты аватара, если он не сменился. Возвращает first_name для сброса кэша
+        """
+        query = (
+            update(cls.model)
+            .where(cls.model.id == user_id, cls.model.image == image)
+            .values(image_variants=variants)
+            .returning(cls.model.first_name)
+        )
+        result = await session.execute(query)
+        return result.scalar_one_or_none()
+
 
 class RefreshSessionDAO(BaseDAO):
     model = RefreshSession
@@ -12,3 +49,57 @@ class RefreshSessionDAO(BaseDAO):
 
 class VerificationSessionDAO(BaseDAO):
     model = VerificationSession
+
+    @classmethod
+    def utc_now(cls):
+        return func.timezone(literal_column("'UTC'"), func.now())
+
+    @classmethod
+    async def db_purge_expired_users(cls, session: AsyncSession, limit: int) -> int:
+        """
+        Удаляет до limit неподтвержденных пользователей с истекшей сессией подтверждения и без живых сессий.
+        Их сессии удаляются каскадно
+        """
+        expired_user_ids = (
+            select(cls.model.user_id)
+            .where(cls.model.expires_at() <= cls.utc_now())
+            .order_by(cls.model.expires_at())
+            .limit(limit)
+        )
+        live_session = (
+            exists()
+            .where(cls.model.user_id == User.id, cls.model.expires_at() > cls.utc_now())
+        )
+        query = (
+            delete(User)
+            .where(User.id.in_(expired_user_ids), User.is_verified.is_(False), ~live_session)
+            .returning(User.id)
+        )
+        result = await session.execute(query)
+        return len(result.all())
+
+    @classmethod
+    async def db_purge_expired_sessions(cls, session: AsyncSession, limit: int) -> int:
+        """
+        Удаляет до limit оставшихся истекших сессий подтверждения.
+        Сессии неподтвержденных пользователей без живой сессии не трогаем: по ним
+        db_purge_expired_users находит и удаляет самих пользователей
+        """
+        live_session = aliased(cls.model)
+        purgeable_user = (
+            exists()
+            .where(
+                User.id == cls.model.user_id,
+                User.is_verified.is_(False),
+                ~exists().where(live_session.user_id == User.id, live_session.expires_at() > cls.utc_now())
+            )
+        )
+        expired_ids = (
+            select(cls.model.id)
+            .where(cls.model.expires_at() <= cls.utc_now(), ~purgeable_user)
+            .order_by(cls.model.expires_at())
+            .limit(limit)
+        )
+        query = delete(cls.model).where(cls.model.id.in_(expired_ids)).returning(cls.model.id)
+        result = await session.execute(query)
+        return len(result.all())
@@ -14,7 +14,7 @@ from app.exceptions import (
     NotActiveSuperUser,
     NotVerifyUser
 )
-from app.user.models import User
+from app.user.schemas import SPrincipal
 from app.user.services import UserService
 
 
@@ -33,7 +33,7 @@ class GetTokenOAuth2PasswordBearer(OAuth2PasswordBearer):
 oauth2_scheme = GetTokenOAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> SPrincipal:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, settings.ALGORITHM)
     except JWTError:
@@ -57,14 +57,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     return current_user
 
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_active_user(current_user: SPrincipal = Depends(get_current_user)) -> SPrincipal:
     if not current_user.is_active:
         raise NotActiveUser
 
     return current_user
 
 
-async def get_current_superuser(current_user: User = Depends(get_current_user)):
+async def get_current_superuser(current_user: SPrincipal = Depends(get_current_user)) -> SPrincipal:
     if not current_user.is_superuser:
         raise NotActiveSuperUser
 
@@ -3,12 +3,16 @@ import enum
 from typing import Optional
 
 from app.database import Base, intpk, created_at
-from sqlalchemy import ForeignKey, UUID
+from sqlalchemy import ForeignKey, UUID, Index, func, literal_column
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 
 class Follow(Base):
     __tablename__ = "follow"
+    __table_args__ = (
+        Index("ix_follow_following_id_follower_id", "following_id", "follower_id"),
+    )
 
     follower_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
     following_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
@@ -30,12 +34,13 @@ class User(Base):
     hashed_password: Mapped[str]
 
     # profile
-    first_name: Mapped[Optional[str]]
+    first_name: Mapped[Optional[str]] = mapped_column(index=True)
     last_name: Mapped[Optional[str]]
     description: Mapped[Optional[str]]
     location: Mapped[Optional[str]]
     gender: Mapped[Gender] = mapped_column(default=Gender.male)
-    image: Mapped[Optional[str]]
+    image: Mapped[Optional[str]] = mapped_column(index=True)
+    image_variants: Mapped[Optional[dict]] = mapped_column(JSONB)
     created_at: Mapped[created_at]
     is_active: Mapped[bool] = mapped_column(default=True)
     is_verified: Mapped[bool] = mapped_column(default=False)
@@ -72,4 +77,14 @@ class VerificationSession(Base):
     verification_token: Mapped[uuid.UUID] = mapped_column(UUID, index=True)
     expires_in: Mapped[int]
     created_at: Mapped[created_at]
-    user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"), index=True)
+
+    @classmethod
+    def expires_at(cls):
+        """
+        Момент истечения сессии. timezone('UTC', ...) делает выражение immutable, поэтому по нему есть индекс
+        """
+        return func.timezone(literal_column("'UTC'"), cls.created_at) + cls.expires_in * literal_column("interval '1 second'")
+
+
+Index("ix_verification_session_expires_at", VerificationSession.expires_at())
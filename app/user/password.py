@@ -0,0 +1,47 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from app.config import settings
+from app.metrics import metrics
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt отпускает GIL, поэтому хватает потоков: event loop не блокируется на время хэширования
+executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+# Ограничение на ожидающие и выполняющиеся хэширования: при всплеске логинов ждут только они
+semaphore = asyncio.Semaphore(settings.PASSWORD_HASH_MAX_CONCURRENCY)
+
+
+def _call(func, *args):
+    started_at = time.perf_counter()
+    result = func(*args)
+
+    return result, started_at, time.perf_counter()
+
+
+async def run_in_pool(name: str, func, *args):
+    """
+    Выполняем func в пуле, учитывая время в очереди (семафор + пул) и время работы
+    """
+    submitted_at = time.perf_counter()
+
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        result, started_at, finished_at = await loop.run_in_executor(executor, _call, func, *args)
+
+    metrics.observe(f"password_hash.{name}.queue", started_at - submitted_at)
+    metrics.observe(f"password_hash.{name}.run", finished_at - started_at)
+
+    return result
+
+
+async def hash_password(password: str) -> str:
+    return await run_in_pool("hash", pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await run_in_pool("verify", pwd_context.verify, plain_password, hashed_password)
@@ -0,0 +1,111 @@
+import time
+from typing import Optional
+
+from app.redis_client import redis_client
+
+
+SESSION_PREFIX = "refresh_session:"
+USER_SESSIONS_PREFIX = "refresh_sessions:user:"
+
+# Все ключи передаются через KEYS: владельца сессии читаем заранее, скрипт проверяет, что он не изменился.
+# Ротация: старый токен гасится, новый выдается тому же пользователю, все одной операцией
+ROTATE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return false
+end
+redis.call('DEL', KEYS[1])
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[3])
+redis.call('ZREM', KEYS[3], ARGV[2])
+redis.call('ZADD', KEYS[3], ARGV[4] + ARGV[3], ARGV[5])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[4])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return ARGV[1]
+"""
+
+REVOKE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+# KEYS[1] - индекс сессий пользователя, дальше ключи сессий, ARGV - их токены.
+# Возвращает, сколько сессий осталось в индексе (появившиеся после чтения индекса)
+REVOKE_ALL_SCRIPT = """
+for i = 2, #KEYS do
+    redis.call('DEL', KEYS[i])
+end
+if #ARGV > 0 then
+    redis.call('ZREM', KEYS[1], unpack(ARGV))
+end
+return redis.call('ZCARD', KEYS[1])
+"""
+
+rotate_script = redis_client.register_script(ROTATE_SCRIPT)
+revoke_script = redis_client.register_script(REVOKE_SCRIPT)
+revoke_all_script = redis_client.register_script(REVOKE_ALL_SCRIPT)
+
+
+class RedisRefreshSessions:
+    """
+    Refresh-сессии в Redis: refresh_session:{token} -> user_id с TTL сессии
+    и индекс сессий пользователя ZSET refresh_sessions:user:{user_id} {token: expires_at}
+    """
+
+    @classmethod
+    def key(cls, token) -> str:
+        return f"{SESSION_PREFIX}{token}"
+
+    @classmethod
+    def user_key(cls, user_id: int) -> str:
+        return f"{USER_SESSIONS_PREFIX}{user_id}"
+
+    @classmethod
+    async def create(cls, user_id: int, token, ttl: int):
+        now = int(time.time())
+        user_key = cls.user_key(user_id)
+
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(cls.key(token), user_id, ex=ttl)
+            pipe.zadd(user_key, {str(token): now + ttl})
+            pipe.zremrangebyscore(user_key, "-inf", now)
+            pipe.expire(user_key, ttl)
+            await pipe.execute()
+
+    @classmethod
+    async def rotate(cls, token, new_token, ttl: int) -> Optional[int]:
+        """
+        Меняем токен на новый. None - сессии нет, она истекла или ее только что сменили
+        """
+        user_id = await redis_client.get(cls.key(token))
+
+        if not user_id:
+            return None
+
+        rotated = await rotate_script(
+            keys=[cls.key(token), cls.key(new_token), cls.user_key(user_id)],
+            args=[user_id, str(token), ttl, int(time.time()), str(new_token)]
+        )
+
+        return int(rotated) if rotated else None
+
+    @classmethod
+    async def revoke(cls, token):
+        user_id = await redis_client.get(cls.key(token))
+
+        if user_id:
+            await revoke_script(keys=[cls.key(token), cls.user_key(user_id)], args=[user_id, str(token)])
+
+    @classmethod
+    async def revoke_all(cls, user_id: int, batch_size: int = 500) -> int:
+        user_key = cls.user_key(user_id)
+        revoked = 0
+
+        while tokens := await redis_client.zrange(user_key, 0, batch_size - 1):
+            revoked += len(tokens)
+
+            if not await revoke_all_script(keys=[user_key, *(cls.key(token) for token in tokens)], args=tokens):
+                break
+
+        return revoked
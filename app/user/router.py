@@ -5,10 +5,10 @@ from fastapi.security import OAuth2PasswordRequestForm
 
 from app.config import settings
 from app.exceptions import IncorrectEmailOrPasswordException, NotVerifyUser
+from app.rate_limit import rate_limit
 from app.user.auth import AuthService
 from app.user.dependencies import get_current_active_user, get_current_superuser
-from app.user.models import User
-from app.user.schemas import SUserCreate, SUserInfo, SToken, SUserUpdate
+from app.user.schemas import SUserCreate, SUserInfo, SToken, SUserUpdate, SPrincipal
 from app.user.services import UserService
 
 router_auth = APIRouter(
@@ -22,12 +22,12 @@ router_user = APIRouter(
 )
 
 
-@router_auth.post("/register", status_code=status.HTTP_201_CREATED)
+@router_auth.post("/register", status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("register"))])
 async def create_new_user(user: SUserCreate) -> SUserInfo:
     return await UserService.service_create_new_user(user)
 
 
-@router_auth.post("/login")
+@router_auth.post("/login", dependencies=[Depends(rate_limit("login"))])
 async def login_user(
         response: Response, credentials: OAuth2PasswordRequestForm = Depends()
 ) -> SToken:
@@ -81,7 +81,9 @@ async def refresh_token_user(request: Request, response: Response) -> SToken:
 
 
 @router_auth.post("/logout")
-async def logout_user(response: Response, request: Request, current_user: User = Depends(get_current_active_user)):
+async def logout_user(
+        response: Response, request: Request, current_user: SPrincipal = Depends(get_current_active_user)
+):
     response.delete_cookie("access_token")
     response.delete_cookie("refresh_token")
 
@@ -90,16 +92,26 @@ async def logout_user(response: Response, request: Request, current_user: User =
     return {"authenticated": False}
 
 
+@router_auth.post("/logout-everywhere")
+async def logout_user_everywhere(response: Response, current_user: SPrincipal = Depends(get_current_active_user)):
+    response.delete_cookie("access_token")
+    response.delete_cookie("refresh_token")
+
+    await AuthService.logout_everywhere(current_user.id)
+
+    return {"authenticated": False}
+
+
 @router_user.post("/upload-image", status_code=status.HTTP_201_CREATED)
 async def upload_image_for_user(
-        current_user: User = Depends(get_current_active_user),
+        current_user: SPrincipal = Depends(get_current_active_user),
         image: UploadFile = File(...)
 ):
     return await UserService.service_upload_image_for_user(current_user.id, image)
 
 
 @router_user.put("/me")
-async def update_user(user: SUserUpdate, current_user: User = Depends(get_current_active_user)) -> SUserInfo:
+async def update_user(user: SUserUpdate, current_user: SPrincipal = Depends(get_current_active_user)) -> SUserInfo:
     return await UserService.service_update_user(current_user.id, user)
 
 
@@ -107,7 +119,7 @@ async def update_user(user: SUserUpdate, current_user: User = Depends(get_curren
 async def delete_user(
         request: Request,
         response: Response,
-        current_user: User = Depends(get_current_active_user)
+        current_user: SPrincipal = Depends(get_current_active_user)
 ):
     response.delete_cookie("access_token")
     response.delete_cookie("refresh_token")
@@ -119,5 +131,5 @@ async def delete_user(
 
 
 @router_user.get("")
-async def get_users_list(current_superuser: User = Depends(get_current_superuser)) -> list[SUserInfo]:
+async def get_users_list(current_superuser: SPrincipal = Depends(get_current_superuser)) -> list[SUserInfo]:
     return await UserService.service_get_users_list()
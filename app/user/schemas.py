@@ -10,6 +10,8 @@ class SFollowInfo(BaseModel):
     follower_id: int
     following_id: int
 
+    model_config = ConfigDict(from_attributes=True)
+
 
 class SUserLiked(BaseModel):
     id: int
@@ -18,6 +20,16 @@ class SUserLiked(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class SPrincipal(BaseModel):
+    id: int
+    first_name: Optional[str] = Field(None)
+    is_active: bool
+    is_verified: bool
+    is_superuser: bool
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class SUserCreate(BaseModel):
     email: EmailStr
     password: str
@@ -47,6 +59,7 @@ class SUserInfo(SUserBase):
     email: EmailStr
     created_at: datetime
     image: Optional[str]
+    image_variants: Optional[dict[str, str]] = None
 
 
 class SToken(BaseModel):
@@ -1,30 +1,33 @@
-from typing import Optional
 from datetime import timedelta
 
 from app.config import settings
 from app.database import async_session_maker
 from app.exceptions import UserAlreadyExistsException, UserNotFound
-from app.image_utils import image_add_origin
-from app.tasks.tasks import send_email_report_dashboard
+from app.image_utils import image_encode_upload, image_relative_path, image_store
+from app.post.dao import ImageFileDAO
+from app.profile.cache import profile_card_cache
+from app.tasks.tasks import send_email_report_dashboard, generate_image_variants
 
 from app.user.auth import AuthService
 from app.user.dao import UserDAO, VerificationSessionDAO
 from app.user.models import User
-from app.user.schemas import SUserCreate, SUserUpdate, SUserInfo
+from app.user.cache import principal_cache
+from app.user.schemas import SUserCreate, SUserUpdate, SUserInfo, SPrincipal
 from fastapi import UploadFile, File
 
 
 class UserService:
     @classmethod
     async def service_create_new_user(cls, user: SUserCreate) -> SUserInfo:
+        # Хэшируем до открытия сессии, чтобы не держать соединение на время bcrypt
+        hashed_password = await AuthService.get_password_hash(user.password)
+
         async with async_session_maker() as session:
             existing_user = await UserDAO.find_one_or_none(session, email=user.email)
 
             if existing_user:
                 raise UserAlreadyExistsException
 
-            hashed_password = AuthService.get_password_hash(user.password)
-
             db_user = await UserDAO.add(
                 session,
                 **user.model_dump(exclude={"password"}),
@@ -50,46 +53,85 @@ class UserService:
         return db_user
 
     @classmethod
-    async def service_get_authorization_user(cls, user_id: int) -> Optional[SUserInfo]:
+    async def service_get_authorization_user(cls, user_id: int) -> SPrincipal:
+        """ Пользователь для авторизации: из кэша, при промахе - проекция из БД.
+        Заполнение, прочитавшее БД до инвалидации, в кэш не попадает.
+        Неактивных и неподтвержденных не кэшируем: активация видна сразу
+        """
+        cached = await principal_cache.get(user_id)
+
+        if cached is not None:
+            return SPrincipal.model_validate_json(cached)
+
+        version = await principal_cache.version(user_id)
+
         async with async_session_maker() as session:
-            db_user = await UserDAO.find_one_or_none(session, id=user_id)
+            db_user = await UserDAO.db_get_principal(session, user_id)
 
         if not db_user:
             raise UserNotFound
 
-        return db_user
+        principal = SPrincipal.model_validate(db_user)
+
+        if principal.is_active and principal.is_verified and version is not None:
+            await principal_cache.set(user_id, principal.model_dump_json(), version)
+
+        return principal
 
     @classmethod
     async def service_upload_image_for_user(cls, user_id: int, image: UploadFile = File(...)):
-        path_folder = f"app/static/user_images/user_{user_id}"
-        path_file = await image_add_origin(path_folder, image)
-        relative_path = f"/user_images/user_{user_id}/{path_file}"
+        encoded = await image_encode_upload(image)
+        relative_path = image_relative_path("/user_images", encoded.content_hash)
 
         async with async_session_maker() as session:
-            await UserDAO.update(
+            old_user = await UserDAO.find_one_or_none(session, id=user_id)
+
+            if not old_user:
+                raise UserNotFound
+
+            if old_user.image == relative_path:
+                return {"message": "Изображение успешно загружено"}
+
+            old_image = old_user.image
+
+            db_user = await UserDAO.update(
                 session,
                 User.id == user_id,
-                image=relative_path
+                image=relative_path,
+                image_variants=None
             )
+            await ImageFileDAO.db_acquire(session, relative_path, encoded.content_hash, len(encoded.data))
+            await ImageFileDAO.db_release(session, old_image)
             await session.commit()
 
+        await image_store(relative_path, encoded.data)
+
+        generate_image_variants.delay("user", user_id, relative_path)
+
+        if db_user.first_name:
+            await profile_card_cache.delete(db_user.first_name)
+
         return {"message": "Изображение успешно загружено"}
 
     @classmethod
     async def service_update_user(cls, user_id: int, user: SUserUpdate) -> SUserInfo:
+        hashed_password = await AuthService.get_password_hash(user.password) if user.password else None
+
         async with async_session_maker() as session:
             db_user = await UserDAO.find_one_or_none(session, id=user_id)
 
             if not db_user:
                 raise UserNotFound
 
+            old_username = db_user.first_name
+
             update_data = user.model_dump(
                 exclude={"is_active", "is_verified", "is_superuser", "password"},
                 exclude_unset=True
             )
 
-            if user.password:
-                update_data["hashed_password"] = AuthService.get_password_hash(user.password)
+            if hashed_password:
+                update_data["hashed_password"] = hashed_password
 
             user_update = await UserDAO.update(
                 session,
@@ -99,14 +141,35 @@ class UserService:
 
             await session.commit()
 
-            return user_update
+        await principal_cache.delete(user_id)
+
+        for username in {old_username, user_update.first_name}:
+            if username:
+                await profile_card_cache.delete(username)
+
+        return user_update
 
     @classmethod
     async def service_delete_user(cls, user_id: int):
         async with async_session_maker() as session:
+            db_user = await UserDAO.find_one_or_none(session, id=user_id)
+
+            if db_user:
+                await ImageFileDAO.db_release(session, db_user.image)
+                await ImageFileDAO.db_release_user_post_images(session, user_id)
+
             await UserDAO.delete(session, id=user_id)
+
             await session.commit()
 
+        await principal_cache.delete(user_id)
+
+        if settings.REFRESH_SESSIONS_IN_REDIS:
+            await AuthService.logout_everywhere(user_id)
+
+        if db_user and db_user.first_name:
+            await profile_card_cache.delete(db_user.first_name)
+
     @classmethod
     async def service_get_users_list(cls) -> list[SUserInfo]:
         async with async_session_maker() as session: